@@ -0,0 +1,67 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) #lets the script run from any directory
+
+import numpy as np
+from models import SchellingModel, SchellingIncomeModel
+from models.compiled import NUMBA_AVAILABLE
+from measures import CompositeSegregationMeasure
+
+
+GRID_SIZES = [50, 100, 200, 500]
+ROUNDS = 5
+SEED = 1
+
+
+def time_rounds(model, rounds=ROUNDS):
+    start = time.perf_counter()
+    completed = 0
+    for _ in range(rounds):
+        completed += 1
+        if not model.step():
+            break
+    return (time.perf_counter() - start) / completed
+
+
+def time_measure(grid, model, is_income_model, backend):
+    start = time.perf_counter()
+    measure = CompositeSegregationMeasure(grid, model.num_agent_types, model.empty_ratio, is_income_model, backend=backend)
+    result = (measure.calculate_morans_i(), measure.calculate_dissimilarity_index())
+    return time.perf_counter() - start, result
+
+
+def warm_up():
+    #compiles the kernels outside the timings
+    model = SchellingIncomeModel(grid_size=10, incremental=True, seed=SEED, backend='numba')
+    model.step()
+    time_measure(model.grid, model, True, 'numba')
+
+
+def main():
+    if not NUMBA_AVAILABLE:
+        print("numba is not installed, nothing to compare")
+        return
+    warm_up()
+    print(f"{'model':<22}{'grid_size':>10}{'incremental':>13}{'python s/round':>16}{'numba s/round':>15}"
+          f"{'python measure':>16}{'numba measure':>15}{'identical':>11}")
+    for model_class in (SchellingModel, SchellingIncomeModel):
+        is_income_model = model_class is SchellingIncomeModel
+        for grid_size in GRID_SIZES:
+            for incremental in (False, True):
+                python_model = model_class(grid_size=grid_size, threshold=0.3, incremental=incremental, seed=SEED)
+                numba_model = model_class(grid_size=grid_size, threshold=0.3, incremental=incremental, seed=SEED,
+                                          backend='numba')
+                python_round = time_rounds(python_model)
+                numba_round = time_rounds(numba_model)
+
+                python_measure, python_result = time_measure(python_model.grid, python_model, is_income_model, 'python')
+                numba_measure, numba_result = time_measure(numba_model.grid, numba_model, is_income_model, 'numba')
+                identical = np.array_equal(python_model.grid, numba_model.grid) and python_result == numba_result
+                print(f"{model_class.__name__:<22}{grid_size:>10}{str(incremental):>13}{python_round:>16.4f}"
+                      f"{numba_round:>15.4f}{python_measure:>16.4f}{numba_measure:>15.4f}{str(identical):>11}")
+
+
+if __name__ == "__main__":
+    main()
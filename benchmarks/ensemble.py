@@ -0,0 +1,38 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) #lets the script run from any directory
+
+from models import SchellingModel, SchellingEnsemble
+
+
+REPLICATES = [10, 50, 200]
+GRID_SIZE = 50
+MAX_ROUNDS = 200
+
+
+def time_separate(replicates):
+    start = time.perf_counter()
+    for seed in range(replicates):
+        model = SchellingModel(grid_size=GRID_SIZE, threshold=0.5, seed=seed)
+        for _ in range(MAX_ROUNDS):
+            if not model.step():
+                break
+    return time.perf_counter() - start
+
+
+def time_ensemble(replicates):
+    start = time.perf_counter()
+    SchellingEnsemble(replicates=replicates, grid_size=GRID_SIZE, threshold=0.5, seed=0).run(MAX_ROUNDS)
+    return time.perf_counter() - start
+
+
+def main():
+    print(f"{'replicates':>10}{'separate (s)':>15}{'ensemble (s)':>15}")
+    for replicates in REPLICATES:
+        print(f"{replicates:>10}{time_separate(replicates):>15.3f}{time_ensemble(replicates):>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) #lets the script run from any directory
+
+from models import SchellingModel, SchellingIncomeModel
+from models.compiled import NUMBA_AVAILABLE
+from measures import MeasureTracker, MeasureCache
+from utils import Instrumentation
+
+
+GRID_SIZES = [100, 300, 600]
+ROUNDS = 50
+BACKENDS = ['python', 'numba'] if NUMBA_AVAILABLE else ['python']
+
+
+def tracker_seconds(model):
+    #time the model spends updating the tracker after each round, as its instrumentation records it
+    model.instrumentation = Instrumentation()
+    MeasureTracker(model)
+    for _ in range(ROUNDS):
+        if not model.step():
+            break
+    return float(model.instrumentation.values('measure_tracker_seconds').sum())
+
+
+def recompute_seconds(model):
+    #time spent recomputing every measure from the grid after each round
+    total = 0.0
+    for _ in range(ROUNDS):
+        if not model.step():
+            break
+        start = time.perf_counter()
+        cache = MeasureCache(model)
+        cache.isolation_index(), cache.morans_i(), cache.dissimilarity_index()
+        total += time.perf_counter() - start
+    return total
+
+
+def main():
+    #both run the same rounds from the same seed, only the cost of keeping the three measures is timed
+    print(f"{'model':<22}{'grid_size':>10}{'backend':>9}{'tracker s':>11}{'recompute s':>13}{'speedup':>9}")
+    for model_class in (SchellingModel, SchellingIncomeModel):
+        for grid_size in GRID_SIZES:
+            for backend in BACKENDS:
+                models = [model_class(grid_size=grid_size, threshold=0.5, seed=0, backend=backend) for _ in range(2)]
+                tracker = tracker_seconds(models[0])
+                recompute = recompute_seconds(models[1])
+                print(f"{model_class.__name__:<22}{grid_size:>10}{backend:>9}{tracker:>11.3f}{recompute:>13.3f}"
+                      f"{recompute / tracker:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) #lets the script run from any directory
+
+from models import SchellingModel
+
+
+GRID_SIZE = 500
+RADII = [1, 2, 3, 5, 10, 20]
+REPEATS = 3
+
+
+def time_counts(model):
+    #best of a few full neighbour counts of every layer
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        model.count_neighbours(model.grid)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    print(f"{'shape':<13}{'boundary':>9}{'radius':>8}{'neighbours':>12}{'s/count':>12}")
+    for shape in ('moore', 'von_neumann'):
+        for boundary in ('clip', 'torus'):
+            for radius in RADII:
+                model = SchellingModel(grid_size=GRID_SIZE, num_agent_types=4, radius=radius, neighbourhood_shape=shape,
+                                       boundary=boundary, seed=0)
+                seconds = time_counts(model)
+                print(f"{shape:<13}{boundary:>9}{radius:>8}{len(model.neighbourhood.offsets):>12}{seconds:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) #lets the script run from any directory
+
+import numpy as np
+from models import SchellingModel, SchellingIncomeModel, ParallelSchellingModel
+
+
+GRID_SIZE = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+ROUNDS = 5
+MODELS = {'schelling': SchellingModel, 'income': SchellingIncomeModel}
+
+
+def process_counts():
+    #1, 2, 4, ... up to the cores available, plus the core count itself
+    cores = os.cpu_count() or 1
+    counts = [2 ** power for power in range(cores.bit_length()) if 2 ** power <= cores]
+    return counts + [cores] if counts[-1] != cores else counts
+
+
+def time_rounds(model_class, processes):
+    #seconds per round over the first few rounds, when the most agents move
+    with ParallelSchellingModel(processes, model_class, seed=0, grid_size=GRID_SIZE, threshold=0.5) as model:
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            model.step()
+        seconds = (time.perf_counter() - start) / ROUNDS
+        return seconds, model.model.grid.copy()
+
+
+def main():
+    with ParallelSchellingModel(1, grid_size=20) as model: #compiles the allocation loop before anything is timed
+        model.step()
+    print(f"{GRID_SIZE}x{GRID_SIZE} grid, {os.cpu_count()} cores")
+    print(f"{'model':<11}{'processes':>10}{'s/round':>10}{'speedup':>9}  same grid")
+    for model_name, model_class in MODELS.items():
+        baseline = None
+        for processes in process_counts():
+            seconds, grid = time_rounds(model_class, processes)
+            if baseline is None:
+                baseline = (seconds, grid)
+            #the result doesn't depend on the number of processes
+            same = np.array_equal(grid, baseline[1])
+            print(f"{model_name:<11}{processes:>10}{seconds:>10.3f}{baseline[0] / seconds:>8.2f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
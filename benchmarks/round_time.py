@@ -0,0 +1,36 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) #lets the script run from any directory
+
+from models import SchellingModel, SchellingIncomeModel
+
+
+GRID_SIZES = [50, 100, 200, 300, 500]
+ROUNDS = 5
+
+
+def time_rounds(model, rounds=ROUNDS):
+    #mean wall time of the first few rounds, which move the most agents
+    start = time.perf_counter()
+    completed = 0
+    for _ in range(rounds):
+        completed += 1
+        if not model.step():
+            break
+    return (time.perf_counter() - start) / completed
+
+
+def main():
+    print(f"{'model':<22}{'grid_size':>10}{'incremental':>13}{'s/round':>12}")
+    for model_class in (SchellingModel, SchellingIncomeModel):
+        for grid_size in GRID_SIZES:
+            for incremental in (False, True):
+                model = model_class(grid_size=grid_size, threshold=0.3, incremental=incremental)
+                seconds = time_rounds(model)
+                print(f"{model_class.__name__:<22}{grid_size:>10}{str(incremental):>13}{seconds:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT)) #lets the script run from any directory
+
+import numpy as np
+from models import SchellingModel, SchellingIncomeModel
+from models.schelling_income_model import income_group_shares
+from measures import CompositeSegregationMeasure
+from utils import COLOURS
+
+
+GRID_SIZES = [50, 100, 250, 500, 1000]
+AGENT_TYPES = [2, 3, 4]
+MODELS = {'schelling': SchellingModel, 'income': SchellingIncomeModel}
+MEASURES = ['calculate_isolation_index', 'calculate_morans_i', 'calculate_dissimilarity_index',
+            'calculate_composite_segregation_measure']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time the models, measures and rendering, results go to a JSON file.")
+    parser.add_argument("--grid-sizes", type=int, nargs="+", default=GRID_SIZES)
+    parser.add_argument("--agent-types", type=int, nargs="+", default=AGENT_TYPES)
+    parser.add_argument("--models", nargs="+", choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument("--repeats", type=int, default=3, help="each timing is the best of this many runs")
+    parser.add_argument("--max-rounds", type=int, default=100, help="round cap for the run to convergence")
+    parser.add_argument("--threshold", type=float, default=0.3)
+    parser.add_argument("--incremental", action="store_true", help="time the incremental models")
+    parser.add_argument("--backend", choices=["python", "numba"], default="python")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gui", action="store_true", help="also time SchellingApp.update_canvas (needs a display)")
+    parser.add_argument("--output", default=None, help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results file to print speedups against")
+    return parser.parse_args()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def best_time(function, repeats):
+    #best of several runs, the least disturbed by other processes
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+class Suite:
+    def __init__(self, args):
+        self.args = args
+        self.results = []
+        self.root = self.open_display() if args.gui else None
+
+    def record(self, model_name, grid_size, num_agent_types, benchmark, seconds, **extra):
+        self.results.append({'model': model_name, 'grid_size': grid_size, 'num_agent_types': num_agent_types,
+                             'benchmark': benchmark, 'seconds': seconds, **extra})
+        print(f"{model_name:<10}{grid_size:>6}{num_agent_types:>4}  {benchmark:<42}{seconds:>10.5f}")
+
+    def make_model(self, model_class, grid_size, num_agent_types):
+        return model_class(grid_size=grid_size, threshold=self.args.threshold, num_agent_types=num_agent_types,
+                           incremental=self.args.incremental, seed=self.args.seed, backend=self.args.backend)
+
+    def run(self):
+        for model_name in self.args.models:
+            model_class = MODELS[model_name]
+            for grid_size in self.args.grid_sizes:
+                for num_agent_types in self.args.agent_types:
+                    self.run_configuration(model_name, model_class, grid_size, num_agent_types)
+        if self.root is not None:
+            self.root.destroy()
+
+    def run_configuration(self, model_name, model_class, grid_size, num_agent_types):
+        repeats = self.args.repeats
+        record = lambda benchmark, seconds, **extra: self.record(model_name, grid_size, num_agent_types,
+                                                                 benchmark, seconds, **extra)
+
+        record('construct', best_time(lambda: self.make_model(model_class, grid_size, num_agent_types), repeats))
+        model = self.make_model(model_class, grid_size, num_agent_types)
+
+        def get_dissatisfied_agents():
+            model.grid_version += 1 #skips the cached satisfaction field
+            model.get_dissatisfied_agents()
+        record('get_dissatisfied_agents', best_time(get_dissatisfied_agents, repeats))
+
+        if model_class is SchellingIncomeModel:
+            num_agents = grid_size ** 2 - int(grid_size ** 2 * model.empty_ratio)
+
+            def define_groups():
+                income_group_shares.cache_clear() #times the solve, not the cache lookup
+                model.define_groups(model.gini_coefficient, num_agents)
+            record('define_groups', best_time(define_groups, repeats))
+
+        #the first round moves the most agents, every repeat starts from the same grid
+        start_grid = model.grid.copy()
+
+        def first_round():
+            model.grid = start_grid.copy()
+            model.seed_empty_cells(model.grid)
+            model.update_dissatisfied_agents()
+            start = time.perf_counter()
+            model.step()
+            return time.perf_counter() - start
+        record('step_first_round', min(first_round() for _ in range(repeats)))
+
+        model = self.make_model(model_class, grid_size, num_agent_types)
+        rounds = 0
+        start = time.perf_counter()
+        while rounds < self.args.max_rounds and model.step():
+            rounds += 1
+        record('run_to_convergence', time.perf_counter() - start, rounds=rounds,
+               converged=rounds < self.args.max_rounds)
+
+        #measures on the settled grid
+        is_income_model = model_class is SchellingIncomeModel
+        for measure_name in MEASURES:
+            def measure():
+                composite = CompositeSegregationMeasure(model.grid, model.num_agent_types, model.empty_ratio,
+                                                        is_income_model, backend=self.args.backend)
+                try:
+                    getattr(composite, measure_name)()
+                except ZeroDivisionError: #timed all the same, the measure has no value for this grid
+                    pass
+            record(measure_name, best_time(measure, repeats))
+
+        self.time_rendering(model, is_income_model, record)
+
+    def time_rendering(self, model, is_income_model, record):
+        from gui.rendering import build_colour_table, grid_to_pixels, pixels_to_ppm #numpy only, no display needed
+        table, offset = build_colour_table(COLOURS)
+        record('render_ppm', best_time(lambda: pixels_to_ppm(grid_to_pixels(model.grid, 500, table, offset)),
+                                       self.args.repeats))
+        if self.root is None:
+            return
+
+        from gui import SchellingApp
+        frame = self.tk.Frame(self.root)
+        app = SchellingApp(frame, model, is_income_model=is_income_model,
+                           render_mode="image" if model.grid_size > 125 else "rectangles")
+
+        def update_canvas():
+            app.update_canvas()
+            self.root.update_idletasks()
+        record(f'update_canvas_{app.render_mode}', best_time(update_canvas, self.args.repeats))
+        frame.destroy()
+
+    def open_display(self):
+        import tkinter as tk
+        self.tk = tk
+        try:
+            root = tk.Tk()
+        except tk.TclError as error:
+            print(f"no display, skipping update_canvas: {error}")
+            return None
+        root.withdraw()
+        return root
+
+
+def compare(results, previous_path):
+    with open(previous_path) as previous_file:
+        previous = json.load(previous_file)
+    key = lambda result: (result['model'], result['grid_size'], result['num_agent_types'], result['benchmark'])
+    before = {key(result): result['seconds'] for result in previous['results']}
+    print(f"\nspeedup against {previous['commit']} (>1 is faster now)")
+    for result in results:
+        if before.get(key(result)) and result['seconds'] > 0:
+            print(f"{result['model']:<10}{result['grid_size']:>6}{result['num_agent_types']:>4}  "
+                  f"{result['benchmark']:<42}{before[key(result)] / result['seconds']:>8.2f}x")
+
+
+def main():
+    args = parse_args()
+    suite = Suite(args)
+    suite.run()
+
+    commit = git_commit()
+    output = Path(args.output) if args.output else ROOT / "benchmarks" / "results" / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'settings': {name: value for name, value in vars(args).items() if name not in ('output', 'compare')},
+        'results': suite.results,
+    }
+    with open(output, "w") as output_file:
+        json.dump(report, output_file, indent=1)
+    print(f"results written to {output}")
+
+    if args.compare:
+        compare(suite.results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
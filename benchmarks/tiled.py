@@ -0,0 +1,46 @@
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) #lets the script run from any directory
+
+from models import TiledSchellingModel
+from models.compiled import NUMBA_AVAILABLE
+from measures import TiledSegregationMeasure
+
+
+GRID_SIZE = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+TILE_ROWS = 256
+ROUNDS = 3
+BACKEND = 'numba' if NUMBA_AVAILABLE else 'python' #the plain python relocation loop takes minutes at this size
+
+
+def timed(function):
+    #seconds and peak allocated MB, numpy reports its arrays to tracemalloc but not the pages of the mapped files
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start, tracemalloc.get_traced_memory()[1] / 2 ** 20
+
+
+def main():
+    #the grid, vacancy pool and mover list live in files, peak allocations should track the strip size, not the grid
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory() as directory:
+        model, seconds, peak = timed(lambda: TiledSchellingModel(directory, grid_size=GRID_SIZE, tile_rows=TILE_ROWS,
+                                                           seed=0, backend=BACKEND))
+        print(f"{GRID_SIZE}x{GRID_SIZE} grid, {TILE_ROWS}-row strips, {BACKEND} backend")
+        print(f"{'construct':<32}{seconds:>10.2f}s{peak:>10.1f} MB peak")
+        for round_number in range(1, ROUNDS + 1):
+            _, seconds, peak = timed(model.step)
+            print(f"{f'round {round_number}':<32}{seconds:>10.2f}s{peak:>10.1f} MB peak")
+        measure = TiledSegregationMeasure(model)
+        for name in ('calculate_isolation_index', 'calculate_morans_i', 'calculate_dissimilarity_index'):
+            _, seconds, peak = timed(getattr(measure, name))
+            print(f"{name:<32}{seconds:>10.2f}s{peak:>10.1f} MB peak")
+
+
+if __name__ == "__main__":
+    main()
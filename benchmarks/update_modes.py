@@ -0,0 +1,44 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) #lets the script run from any directory
+
+import numpy as np
+from models import SchellingModel, SchellingIncomeModel
+
+
+GRID_SIZES = [50, 100, 200]
+THRESHOLDS = [0.3, 0.5]
+SEEDS = range(5)
+MAX_ROUNDS = 200
+MODELS = {'schelling': SchellingModel, 'income': SchellingIncomeModel}
+
+
+def run(model_class, grid_size, threshold, update_mode, seed):
+    #rounds until no agent moves (capped), wall time and final satisfaction
+    model = model_class(grid_size=grid_size, threshold=threshold, update_mode=update_mode, seed=seed)
+    rounds = 0
+    start = time.perf_counter()
+    while rounds < MAX_ROUNDS and model.step():
+        rounds += 1
+    return rounds, time.perf_counter() - start, model.calculate_satisfaction()
+
+
+def main():
+    #synchronous rounds are a different dynamics, so rounds to convergence are compared as well as time
+    print(f"{'model':<11}{'size':>5}{'threshold':>10}  {'mode':<12}{'rounds':>8}{'capped':>8}{'seconds':>9}"
+          f"{'s/round':>9}{'satisfied':>10}")
+    for model_name, model_class in MODELS.items():
+        for grid_size in GRID_SIZES:
+            for threshold in THRESHOLDS:
+                for update_mode in ('sequential', 'synchronous'):
+                    runs = np.array([run(model_class, grid_size, threshold, update_mode, seed) for seed in SEEDS])
+                    rounds, seconds, satisfaction = runs.mean(axis=0)
+                    capped = int(np.count_nonzero(runs[:, 0] == MAX_ROUNDS))
+                    print(f"{model_name:<11}{grid_size:>5}{threshold:>10}  {update_mode:<12}{rounds:>8.1f}"
+                          f"{capped:>8}{seconds:>9.3f}{seconds / max(rounds, 1):>9.4f}{satisfaction:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
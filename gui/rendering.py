@@ -0,0 +1,41 @@
+import numpy as np
+
+
+NAMED_COLOURS = {'white': (255, 255, 255), 'black': (0, 0, 0)}
+
+
+def hex_to_rgb(colour):
+    if colour in NAMED_COLOURS:
+        return NAMED_COLOURS[colour]
+    colour = colour.lstrip('#')
+    return tuple(int(colour[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def build_colour_table(colours, default='white'):
+    #lookup table from cell value to RGB, cell value v is at row v - offset
+    offset = min(colours)
+    table = np.tile(np.array(hex_to_rgb(default), dtype=np.uint8), (max(colours) - offset + 1, 1))
+    for value, colour in colours.items():
+        table[value - offset] = hex_to_rgb(colour)
+    return table, offset
+
+
+def grid_to_pixels(grid, canvas_size, colour_table, offset, grid_lines=True):
+    #RGB image of the grid at canvas resolution, each pixel takes the colour of the cell it falls in
+    grid_size = grid.shape[0]
+    cell_of_pixel = (np.arange(canvas_size) * grid_size) // canvas_size
+    values = np.clip(grid - offset, 0, len(colour_table) - 1) #values outside the table get the edge colours
+    pixels = colour_table[values[np.ix_(cell_of_pixel, cell_of_pixel)]]
+
+    #black cell outlines like the rectangle drawing, only where cells are big enough to see them
+    if grid_lines and canvas_size / grid_size >= 4:
+        cell_starts = np.flatnonzero(np.diff(cell_of_pixel, prepend=-1))
+        pixels[cell_starts, :] = 0
+        pixels[:, cell_starts] = 0
+    return pixels
+
+
+def pixels_to_ppm(pixels):
+    #binary PPM, which tk.PhotoImage reads directly from bytes
+    height, width = pixels.shape[:2]
+    return f'P6 {width} {height} 255 '.encode() + np.ascontiguousarray(pixels, dtype=np.uint8).tobytes()
@@ -1,16 +1,48 @@
+import threading
+import time
 import tkinter as tk
-from models import SchellingModel, SchellingIncomeModel
-from measures import CompositeSegregationMeasure
-from utils import COLOURS
+from tkinter import filedialog
+import numpy as np
+from models import (SchellingModel, SchellingIncomeModel, TrajectoryRecorder, Trajectory,
+                    save_checkpoint, load_checkpoint, ConvergenceDetector)
+from measures import MeasureCache
+from utils import COLOURS, Instrumentation
+from .rendering import build_colour_table, grid_to_pixels, pixels_to_ppm
+from .simulation_worker import SimulationWorker
 
 
 class SchellingApp:
-    def __init__(self, master, model, is_income_model=False):
+    def __init__(self, master, model, is_income_model=False, render_mode="image"):
         self.master = master
         self.model = model
         self.running = False
         self.rounds = 0
         self.is_income_model = is_income_model
+        self.measure_cache = MeasureCache(model) #measures are only recomputed once the grid has changed
+
+        #"image" draws the grid as one PhotoImage, "rectangles" keeps one canvas item per cell and recolours changed ones
+        self.render_mode = render_mode
+        self.max_grid_size = 500 if render_mode == "image" else 125
+        self.colour_table, self.colour_offset = build_colour_table(COLOURS)
+        self.photo = None
+        self.image_item = None
+        self.cell_items = None
+        self.drawn_grid = None
+
+        #background stepping, the GUI redraws the latest snapshot at a fixed frame rate
+        self.model_lock = threading.Lock()
+        self.worker = None
+        self.steps_per_frame = 1
+        self.frame_interval = 33 #ms, about 30 frames per second
+        self.last_frame = None
+
+        #optional stats panel, the model is only instrumented while it's shown
+        self.stats_frame = None
+        self.stats_label = None
+
+        #replay of a recorded run, the model is left alone while one is shown
+        self.trajectory = None
+        self.replay_frame = None
 
         self.canvas_size = 500
         self.cell_size = self.canvas_size / self.model.grid_size
@@ -45,7 +77,10 @@ class SchellingApp:
         self.satisfaction_label.grid(row=1, column=0, columnspan=2)
 
         self.rounds_label = tk.Label(self.main_frame, text="Rounds: 0")
-        self.rounds_label.grid(row=1, column=2, columnspan=2)
+        self.rounds_label.grid(row=1, column=2)
+
+        self.speed_label = tk.Label(self.main_frame, text="Rounds/s: 0")
+        self.speed_label.grid(row=1, column=3)
 
         #sets control buttons and sliders
         self.create_controls()
@@ -64,7 +99,7 @@ class SchellingApp:
         self.empty_slider.set(self.model.empty_ratio)
         self.empty_slider.pack(side=tk.LEFT, padx=5)
 
-        self.grid_size_slider = tk.Scale(self.control_frame, from_=10, to=125, resolution=1,
+        self.grid_size_slider = tk.Scale(self.control_frame, from_=10, to=self.max_grid_size, resolution=1,
                                          orient=tk.HORIZONTAL, label="Grid Size (NxN)", command=self.update_grid_size)
         self.grid_size_slider.set(self.model.grid_size)
         self.grid_size_slider.pack(side=tk.LEFT, padx=5)
@@ -74,6 +109,10 @@ class SchellingApp:
         self.agent_type_slider.set(self.model.num_agent_types)
         self.agent_type_slider.pack(side=tk.LEFT, padx=5)
 
+        self.steps_slider = tk.Scale(self.control_frame, from_=1, to=50, resolution=1,
+                                     orient=tk.HORIZONTAL, label="Steps per Frame", command=self.update_steps_per_frame)
+        self.steps_slider.pack(side=tk.LEFT, padx=5)
+
         self.button_frame = tk.Frame(self.main_frame)
         self.button_frame.grid(row=3, column=0, columnspan=4)
 
@@ -92,86 +131,365 @@ class SchellingApp:
         self.output_measure_button = tk.Button(self.button_frame, text="Calculate Segregation Measure", command=self.output_measure)
         self.output_measure_button.pack(side=tk.LEFT, padx=5)
 
-    def update_canvas(self):
-        self.canvas.delete("all")
-        for x in range(self.model.grid_size):
-            for y in range(self.model.grid_size):
-                agent = self.model.grid[x, y]
-                colour = COLOURS.get(agent, 'white')#defaults to white if agent not found in dictionary
-                self.canvas.create_rectangle(y * self.cell_size, x * self.cell_size,
-                                             (y + 1) * self.cell_size, (x + 1) * self.cell_size,
-                                             fill=colour, outline="black")
-        satisfaction = self.model.calculate_satisfaction()
+        self.background_var = tk.BooleanVar(value=True)
+        self.background_check = tk.Checkbutton(self.button_frame, text="Background Worker", variable=self.background_var)
+        self.background_check.pack(side=tk.LEFT, padx=5)
+
+        self.stats_var = tk.BooleanVar(value=False)
+        self.stats_check = tk.Checkbutton(self.button_frame, text="Show Stats", variable=self.stats_var,
+                                          command=self.toggle_stats)
+        self.stats_check.pack(side=tk.LEFT, padx=5)
+
+        self.convergence_var = tk.BooleanVar(value=False)
+        self.convergence_check = tk.Checkbutton(self.button_frame, text="Stop on Plateau/Cycle",
+                                                variable=self.convergence_var, command=self.toggle_convergence)
+        self.convergence_check.pack(side=tk.LEFT, padx=5)
+
+        self.file_frame = tk.Frame(self.main_frame)
+        self.file_frame.grid(row=5, column=0, columnspan=4)
+
+        self.record_var = tk.BooleanVar(value=False)
+        self.record_check = tk.Checkbutton(self.file_frame, text="Record", variable=self.record_var,
+                                           command=self.toggle_recording)
+        self.record_check.pack(side=tk.LEFT, padx=5)
+
+        self.save_recording_button = tk.Button(self.file_frame, text="Save Recording", command=self.save_recording)
+        self.save_recording_button.pack(side=tk.LEFT, padx=5)
+
+        self.replay_button = tk.Button(self.file_frame, text="Replay", command=self.open_replay)
+        self.replay_button.pack(side=tk.LEFT, padx=5)
+
+        self.save_checkpoint_button = tk.Button(self.file_frame, text="Save Checkpoint", command=self.save_checkpoint)
+        self.save_checkpoint_button.pack(side=tk.LEFT, padx=5)
+
+        self.load_checkpoint_button = tk.Button(self.file_frame, text="Load Checkpoint", command=self.load_checkpoint)
+        self.load_checkpoint_button.pack(side=tk.LEFT, padx=5)
+
+    def draw_image(self, grid):
+        pixels = grid_to_pixels(grid, self.canvas_size, self.colour_table, self.colour_offset)
+        self.photo = tk.PhotoImage(data=pixels_to_ppm(pixels), format="PPM") #reference kept so Tk doesn't drop it
+        if self.image_item is None:
+            self.image_item = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+        else:
+            self.canvas.itemconfig(self.image_item, image=self.photo)
+        return 1
+
+    def draw_rectangles(self, grid):
+        #returns the number of canvas items created or recoloured
+        items_drawn = 0
+        if self.drawn_grid is None or self.drawn_grid.shape != grid.shape:
+            #grid size changed, rebuilds every item once
+            self.canvas.delete("all")
+            self.image_item = None
+            self.cell_items = {}
+            cell_size = self.canvas_size / grid.shape[0] #a replayed grid can differ in size from the model's
+            for x in range(grid.shape[0]):
+                for y in range(grid.shape[1]):
+                    colour = COLOURS.get(grid[x, y], 'white')#defaults to white if agent not found in dictionary
+                    self.cell_items[x, y] = self.canvas.create_rectangle(y * cell_size, x * cell_size,
+                                                                         (y + 1) * cell_size, (x + 1) * cell_size,
+                                                                         fill=colour, outline="black")
+            items_drawn = len(self.cell_items)
+        else:
+            #only recolours cells that changed since the last frame
+            for x, y in np.argwhere(grid != self.drawn_grid).tolist():
+                self.canvas.itemconfig(self.cell_items[x, y], fill=COLOURS.get(grid[x, y], 'white'))
+                items_drawn += 1
+        self.drawn_grid = grid.copy()
+        return items_drawn
+
+    def update_canvas(self, snapshot=None):
+        #draws a worker snapshot, or the model itself when no worker is running
+        if snapshot is None:
+            grid = self.model.grid
+            satisfaction = self.model.calculate_satisfaction()
+        else:
+            grid = snapshot['grid']
+            satisfaction = snapshot['satisfaction']
+            self.rounds = snapshot['rounds']
+        reason = self.model.termination_reason if snapshot is None else snapshot.get('termination_reason')
+
+        instrumentation = self.model.instrumentation
+        if instrumentation is not None:
+            start = time.perf_counter()
+        if self.render_mode == "image":
+            items_drawn = self.draw_image(grid)
+        else:
+            items_drawn = self.draw_rectangles(grid)
         self.satisfaction_label.config(text=f"Satisfied Agents: {satisfaction}%")
-        self.rounds_label.config(text=f"Rounds: {self.rounds}")
+        if reason in ('plateau', 'cycle'): #the run was ended before every agent was satisfied
+            self.rounds_label.config(text=f"Rounds: {self.rounds} ({reason})")
+        else:
+            self.rounds_label.config(text=f"Rounds: {self.rounds}")
+        if instrumentation is not None:
+            instrumentation.record(draw_seconds=time.perf_counter() - start, canvas_items_drawn=items_drawn)
+            self.update_stats()
 
     def update_threshold(self, value):
-        self.model.threshold = round(float(value), 2)
-        self.recalculate_dissatisfaction()
+        with self.model_lock: #can change while the worker is running
+            self.model.threshold = round(float(value), 2)
+            self.recalculate_dissatisfaction()
+
+    def update_steps_per_frame(self, value):
+        self.steps_per_frame = int(value)
+        if self.worker is not None:
+            self.worker.steps_per_frame = self.steps_per_frame
 
     def update_empty_ratio(self, value):
+        if round(float(value), 2) == self.model.empty_ratio: #slider set to the model's own value, e.g. after loading
+            return
+        self.stop()
         self.model.empty_ratio = round(float(value), 2)
         self.reset()
 
     def update_grid_size(self, value):
         grid_size = int(value)
+        if grid_size == self.model.grid_size:
+            return
+        self.stop()
         self.model.grid_size = grid_size
         self.cell_size = self.canvas_size / grid_size
         self.reset()
 
     def update_agent_types(self, value):
         num_agent_types = int(value)
+        if num_agent_types == self.model.num_agent_types:
+            return
+        self.stop()
+        instrumentation = self.model.instrumentation
         if not self.is_income_model:
             self.model = SchellingModel(grid_size=self.model.grid_size, threshold=self.model.threshold,
-                                    empty_ratio=self.model.empty_ratio, num_agent_types=num_agent_types)
+                                    empty_ratio=self.model.empty_ratio, num_agent_types=num_agent_types,
+                                    incremental=self.model.incremental, relocation=self.model.relocation,
+                                    seed=self.model.rng, backend=self.model.backend, update_mode=self.model.update_mode,
+                                    **self.model.neighbourhood.parameters())
         else:
             self.model = SchellingIncomeModel(grid_size=self.model.grid_size, threshold=self.model.threshold,
                                     empty_ratio=self.model.empty_ratio, num_agent_types=num_agent_types,
-                                    mean_income=self.model.mean_income, gini_coefficient=self.model.gini_coefficient)
+                                    mean_income=self.model.mean_income, gini_coefficient=self.model.gini_coefficient,
+                                    incremental=self.model.incremental, relocation=self.model.relocation,
+                                    seed=self.model.rng, backend=self.model.backend, update_mode=self.model.update_mode,
+                                    **self.model.neighbourhood.parameters())
+        self.model.instrumentation = instrumentation
+        if self.record_var.get():
+            TrajectoryRecorder(self.model)
+        if self.convergence_var.get():
+            ConvergenceDetector(self.model)
         self.reset()
 
     def update_mean_income(self, value):
+        if float(value) == self.model.mean_income:
+            return
+        self.stop()
         self.model.mean_income = float(value)
         self.reset()
 
     def update_gini_coefficient(self, value):
+        if round(float(value), 2) == self.model.gini_coefficient:
+            return
+        self.stop()
         self.model.gini_coefficient = round(float(value), 2)
         self.reset()
 
     def reset(self):
-        self.running = False
+        self.stop()
+        self.close_replay()
         self.rounds = 0
-        self.model.grid = self.model.initialize_grid()
-        self.recalculate_dissatisfaction()
+        self.model.reset()
         self.update_canvas()
 
     def start(self):
+        self.close_replay()
         if not self.running:
             self.running = True
-            self.run_simulation()
+            self.last_frame = (time.perf_counter(), self.rounds)
+            if self.background_var.get():
+                self.worker = SimulationWorker(self.model, self.model_lock, self.rounds, self.steps_per_frame)
+                self.worker.start()
+                self.poll_worker(self.worker)
+            else:
+                self.run_simulation()
         else:
             pass
 
     def stop(self):
         self.running = False
+        if self.worker is not None:
+            #waits for the round in progress, so the model is never changed mid-step
+            worker, self.worker = self.worker, None
+            worker.stop()
+            self.rounds = worker.rounds
+            self.update_canvas() #shows the rounds stepped since the last frame
 
     def step(self):
-        moved = self.model.step()
-        if moved:
-            self.rounds += 1
-        self.update_canvas()
+        self.close_replay()
+        with self.model_lock:
+            self.model.step()
+            moved = self.model.termination_reason != 'converged' #a round ended by the detector still moved agents
+            if moved and self.worker is not None:
+                self.worker.rounds += 1
+            elif moved:
+                self.rounds += 1
+        if self.worker is None:
+            self.update_canvas()
 
     def output_measure(self):
-        composite_measure = CompositeSegregationMeasure(self.model.grid, self.model.num_agent_types, self.model.empty_ratio, self.is_income_model)
-        print(f'Composite Measure: {composite_measure.calculate_composite_segregation_measure()}')
+        with self.model_lock:
+            if self.measure_cache.model is not self.model: #the model was replaced, e.g. by a new agent type count
+                self.measure_cache = MeasureCache(self.model)
+            measures = self.measure_cache.composite_segregation_measure()
+        print(f"Composite Measure: ({measures['composite_x']:.5f} , {measures['composite_y']:.5f})")
+        print(f"Isolation Index: {measures['isolation_index']:.5f}  Moran's I: {measures['morans_i']:.5f}  "
+              f"Dissimilarity Index: {measures['dissimilarity_index']:.5f}")
+
+    def update_speed(self):
+        now = time.perf_counter()
+        last_time, last_rounds = self.last_frame
+        if now - last_time >= 0.5: #averaged over half a second so the readout doesn't flicker
+            self.speed_label.config(text=f"Rounds/s: {(self.rounds - last_rounds) / (now - last_time):.1f}")
+            self.last_frame = (now, self.rounds)
+
+    def poll_worker(self, worker):
+        if worker is not self.worker: #stopped, or replaced by a newer worker with its own polling loop
+            return
+        snapshot = worker.latest()
+        if snapshot is not None:
+            self.update_canvas(snapshot)
+            self.update_speed()
+            if snapshot['termination_reason'] in ('plateau', 'cycle'): #the worker has stopped itself
+                self.stop()
+                return
+        self.master.after(self.frame_interval, self.poll_worker, worker)
 
     def run_simulation(self):
         if self.running:
-            moved = self.model.step()
-            if moved:
-                self.rounds += 1
+            for _ in range(self.steps_per_frame):
+                stepped = self.model.step()
+                if self.model.termination_reason != 'converged':
+                    self.rounds += 1
+                if not stepped:
+                    break
+            if self.model.termination_reason in ('plateau', 'cycle'):
+                self.running = False
             self.update_canvas()
+            self.update_speed()
             self.master.after(1, self.run_simulation)
 
+    def toggle_stats(self):
+        with self.model_lock:
+            if self.stats_var.get():
+                self.model.instrumentation = Instrumentation()
+            else:
+                self.model.instrumentation = None #no overhead while the panel is hidden
+        if self.stats_var.get():
+            self.stats_frame = tk.Frame(self.main_frame)
+            self.stats_frame.grid(row=4, column=0, columnspan=4, sticky=tk.W)
+            self.stats_label = tk.Label(self.stats_frame, justify=tk.LEFT, font=("Courier", 9))
+            self.stats_label.pack(side=tk.LEFT)
+            self.update_stats()
+        elif self.stats_frame is not None:
+            self.stats_frame.destroy()
+            self.stats_frame = self.stats_label = None
+
+    def update_stats(self):
+        if self.stats_label is None or self.model.instrumentation is None:
+            return
+        summary = self.model.instrumentation.summary()
+        lines = [f"{'':<26}{'latest':>12}{'mean (50)':>12}{'total':>12}"]
+        for name in sorted(summary):
+            values = summary[name]
+            lines.append(f"{name:<26}{values['latest']:>12.4g}{values['mean']:>12.4g}{values['total']:>12.4g}")
+        self.stats_label.config(text="\n".join(lines))
+
+    def toggle_convergence(self):
+        with self.model_lock:
+            if self.convergence_var.get():
+                ConvergenceDetector(self.model) #watches from the current grid
+            else:
+                self.model.convergence_detector = None
+
+    def toggle_recording(self):
+        with self.model_lock:
+            if self.record_var.get():
+                TrajectoryRecorder(self.model) #starts from the current grid
+            else:
+                self.model.trajectory_recorder = None
+
+    def save_recording(self):
+        recorder = self.model.trajectory_recorder
+        if recorder is None:
+            print("Nothing recorded, tick Record first")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".npz", filetypes=[("Trajectory", "*.npz")])
+        if path:
+            with self.model_lock:
+                recorder.save(path)
+
+    def save_checkpoint(self):
+        path = filedialog.asksaveasfilename(defaultextension=".npz", filetypes=[("Checkpoint", "*.npz")])
+        if path:
+            with self.model_lock:
+                save_checkpoint(self.model, path)
+
+    def load_checkpoint(self):
+        path = filedialog.askopenfilename(filetypes=[("Checkpoint", "*.npz")])
+        if not path:
+            return
+        self.stop()
+        self.close_replay()
+        model = load_checkpoint(path)
+        if isinstance(model, SchellingIncomeModel) != self.is_income_model:
+            print("Checkpoint is for the other model tab")
+            return
+        model.instrumentation = self.model.instrumentation
+        self.model = model
+        if self.record_var.get():
+            TrajectoryRecorder(self.model)
+        if self.convergence_var.get():
+            ConvergenceDetector(self.model)
+
+        #sliders show the loaded parameters, their callbacks skip values the model already has
+        self.threshold_slider.set(model.threshold)
+        self.empty_slider.set(model.empty_ratio)
+        self.grid_size_slider.set(model.grid_size)
+        self.agent_type_slider.set(model.num_agent_types)
+        if self.is_income_model:
+            self.gini_slider.set(model.gini_coefficient)
+            self.mean_income_slider.set(model.mean_income)
+        self.cell_size = self.canvas_size / model.grid_size
+        self.rounds = 0
+        self.update_canvas()
+
+    def open_replay(self):
+        path = filedialog.askopenfilename(filetypes=[("Trajectory", "*.npz")])
+        if not path:
+            return
+        self.stop()
+        self.close_replay()
+        self.trajectory = Trajectory.load(path)
+        self.model_rounds = self.rounds #shown again when the replay is closed
+        self.replay_frame = tk.Frame(self.main_frame)
+        self.replay_frame.grid(row=6, column=0, columnspan=4, sticky=tk.EW)
+        self.replay_slider = tk.Scale(self.replay_frame, from_=0, to=self.trajectory.num_rounds, resolution=1,
+                                      orient=tk.HORIZONTAL, label="Replay Round", length=400, command=self.show_replay_round)
+        self.replay_slider.pack(side=tk.LEFT, padx=5)
+        tk.Button(self.replay_frame, text="Exit Replay", command=self.close_replay).pack(side=tk.LEFT, padx=5)
+        self.show_replay_round(0)
+
+    def show_replay_round(self, value):
+        if self.trajectory is None:
+            return
+        round_number = int(value)
+        self.update_canvas({'grid': self.trajectory.grid_at(round_number), 'satisfaction': '-', 'rounds': round_number})
+
+    def close_replay(self):
+        if self.trajectory is None:
+            return
+        self.trajectory = None
+        self.replay_frame.destroy()
+        self.replay_frame = None
+        self.rounds = self.model_rounds
+        self.update_canvas() #back to the model
+
     def recalculate_dissatisfaction(self):
-        self.model.dissatisfied_agents = self.model.get_dissatisfied_agents()
+        self.model.update_dissatisfied_agents()
@@ -0,0 +1,48 @@
+import threading
+
+
+class SimulationWorker:
+    #steps the model on a background thread, the GUI only ever reads the latest snapshot
+    def __init__(self, model, lock, rounds=0, steps_per_frame=1):
+        self.model = model
+        self.lock = lock #shared with the GUI, held while the model is being stepped or changed
+        self.rounds = rounds
+        self.steps_per_frame = steps_per_frame
+        self.snapshot = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            moved_any = False
+            #the lock is taken per round, so the GUI can change the model or stop the worker between any two rounds
+            for _ in range(self.steps_per_frame):
+                if self.stop_event.is_set():
+                    return
+                with self.lock:
+                    stepped = self.model.step()
+                    if self.model.termination_reason != 'converged': #a round ended by the detector still moved agents
+                        self.rounds += 1
+                        moved_any = True
+                if not stepped:
+                    break
+            with self.lock:
+                snapshot = {'grid': self.model.grid.copy(), 'satisfaction': self.model.calculate_satisfaction(),
+                            'rounds': self.rounds, 'termination_reason': self.model.termination_reason}
+            self.snapshot = snapshot #replaces any frame the GUI hasn't drawn yet
+
+            if snapshot['termination_reason'] in ('plateau', 'cycle'):
+                break #the run won't settle, the GUI stops polling once it has drawn this frame
+
+            if not moved_any:
+                self.stop_event.wait(0.05) #nothing moved, waits for e.g. a threshold change instead of spinning
+
+    def latest(self):
+        return self.snapshot
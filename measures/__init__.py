@@ -1,3 +1,6 @@
 from .composite_segregation_measure import CompositeSegregationMeasure
+from .measure_tracker import MeasureTracker
+from .measure_cache import MeasureCache
+from .tiled_measure import TiledSegregationMeasure
 
-__all__ = ['CompositeSegregationMeasure']
+__all__ = ['CompositeSegregationMeasure', 'MeasureTracker', 'MeasureCache', 'TiledSegregationMeasure']
@@ -1,38 +1,114 @@
 import numpy as np
-from collections import defaultdict
 from itertools import combinations
+from models import compiled
+from models.neighbourhood import Neighbourhood
+from utils import decode_cells
+
+
+MORANS_PRODUCT_LIMIT = 12 #neighbour offsets moran's i keeps one product plane for, above this it uses neighbourhood sums
+
+
+def sequential_sum(values):
+    #adds values left to right like the original python loops did, so the results match them bit for bit
+    values = np.ravel(values)
+    return float(np.cumsum(values)[-1]) if values.size else 0
+
+
+def row_pair_differences(row_counts, groups):
+    #per-row |share_i - share_j| for every pair of groups, rows that lack either group are skipped
+    total_counts = row_counts.sum(axis=0)
+    pairs = list(combinations(groups, 2))#all pair combinations
+    diffs = np.zeros((row_counts.shape[0], len(pairs)))
+    permutations = 0
+    for k, (i, j) in enumerate(pairs):
+        count_i = row_counts[:, i]
+        count_j = row_counts[:, j]
+        present = (count_i != 0) & (count_j != 0)
+        if not present.any():
+            continue
+        diffs[present, k] = np.abs((count_i[present] / total_counts[i]) - (count_j[present] / total_counts[j]))
+        permutations += int(np.count_nonzero(present))
+
+    #rows outer and pairs inner, the same order the loop summed them in
+    return sequential_sum(diffs), permutations
 
 
 class CompositeSegregationMeasure:
-    def __init__(self, grid, num_agent_types, empty_ratio, is_income_model=False):
+    def __init__(self, grid, num_agent_types, empty_ratio, is_income_model=False, backend='python', satisfaction=None,
+                 radius=1, neighbourhood_shape='moore', boundary='clip'):
         self.grid = grid
         self.grid_size = grid.shape[0]
-        self.empty = -1 #to pass into isolations's is_satisfied function
+        self.empty = -1
         self.num_agent_types = num_agent_types
         self.empty_ratio = empty_ratio
         self.is_income_model = is_income_model
-        
+        self.backend = compiled.resolve_backend(backend) #'numba' runs the moran's i and dissimilarity sums as compiled loops
+        self.satisfaction = satisfaction #the model's satisfaction field for this grid, if it already has one
+
+        #isolation uses the models' neighbourhood, moran's i the von neumann one of the same radius (rook by default)
+        self.neighbourhood = Neighbourhood(radius, neighbourhood_shape, boundary)
+        self.weights = Neighbourhood(radius, 'von_neumann', boundary)
+        self.neighbourhood.check_grid(self.grid_size)
+
+        #decodes the grid once into planes, empty cells get 0 in both
+        self.occupied, self.agent_types, self.income_groups = decode_cells(grid, is_income_model)
+
     def calculate_isolation_index(self):
-        # Import here to avoid circular imports
-        from models import SchellingModel, SchellingIncomeModel
-        
         if self.empty_ratio == 1:
             return 0
 
-        isolation_indices = []
+        if self.satisfaction is not None:
+            return np.mean(self.satisfaction.ravel()) if self.satisfaction.size else 0
+
+        #same satisfaction field as the models' is_satisfied, computed for the whole grid at once
+        count_dtype = self.neighbourhood.count_dtype
+        total_neighbours = self.neighbourhood.sum(self.occupied.astype(count_dtype))
+        same_agent_type = np.zeros(self.grid.shape, dtype=count_dtype)
+        for agent_type in range(1, self.num_agent_types + 1):
+            is_type = self.agent_types == agent_type
+            same_agent_type += np.where(is_type, self.neighbourhood.sum(is_type.astype(count_dtype)), 0).astype(count_dtype)
+
+        has_neighbours = self.occupied & (total_neighbours > 0)
+        if self.is_income_model:
+            income_group_comparison = np.zeros(self.grid.shape)
+            for income_group in range(1, 6):
+                income_count = self.neighbourhood.sum((self.income_groups == income_group).astype(count_dtype))
+                income_group_comparison += income_count * (1 - (np.abs(income_group - self.income_groups) / 4))
+            #counts are widened before doubling, twice a neighbourhood of over 63 cells overflows int8
+            ratios = ((income_group_comparison[has_neighbours] + same_agent_type[has_neighbours])
+                      / (2 * total_neighbours[has_neighbours].astype(np.int64)))
+        else:
+            ratios = same_agent_type[has_neighbours] / total_neighbours[has_neighbours]
+
+        isolation_indices = np.ones(self.grid.shape)
+        isolation_indices[has_neighbours] = ratios
 
-        for x in range(self.grid_size):
-            for y in range(self.grid_size):
-                if self.is_income_model:
-                    isolation_indices.append(SchellingIncomeModel.is_satisfied(self, x, y))
-                else:
-                    isolation_indices.append(SchellingModel.is_satisfied(self, x, y))
-                
         #calculates the mean isolation index
-        isolation_index = np.mean(isolation_indices) if isolation_indices else 0
+        isolation_index = np.mean(isolation_indices.ravel()) if isolation_indices.size else 0
         return isolation_index
 
 
+    def standardised_composite(self):
+        #composite attribute of every cell (0 for empty cells), None when an attribute has no variation
+        agent_type_list = self.agent_types[self.occupied]
+        xbar_agent_type = np.mean(agent_type_list)
+
+        if not self.is_income_model:
+            return np.where(self.occupied, self.agent_types - xbar_agent_type, 0.0)
+
+        agent_type_std_dev = np.std(agent_type_list)
+        agent_income_group_list = self.income_groups[self.occupied]
+        xbar_income_group = np.mean(agent_income_group_list)
+        agent_income_group_std_dev = np.std(agent_income_group_list)
+
+        #check for zero standard deviation
+        if agent_type_std_dev == 0 or agent_income_group_std_dev == 0:
+            return None
+
+        standardised_agent_type = (self.agent_types - xbar_agent_type) / agent_type_std_dev
+        standardised_agent_income_group = (self.income_groups - xbar_income_group) / agent_income_group_std_dev
+        return np.where(self.occupied, (standardised_agent_type + standardised_agent_income_group) / 2, 0.0)
+
     def calculate_morans_i(self):
         if self.empty_ratio == 1:
             return 0
@@ -41,91 +117,11 @@ class CompositeSegregationMeasure:
         num_empty = int(total_cells * self.empty_ratio)
         num_agents = total_cells - num_empty
 
-        #for np calcs
-        agent_type_list = []
-        agent_income_group_list = []
-
-        for x in range(self.grid_size):
-            for y in range(self.grid_size):
-                agent = self.grid[x, y]
-                if agent == self.empty:  
-                    continue
-
-                if self.is_income_model:
-                    agent_type = agent // 10
-                    agent_income_group = agent % 10
-                    agent_type_list.append(agent_type)
-                    agent_income_group_list.append(agent_income_group)
-                else:
-                    agent_type = agent
-                    agent_type_list.append(agent_type)
-
-        #calculate means and standard deviations
-        xbar_agent_type = np.mean(agent_type_list)
-
-        if self.is_income_model:
-            agent_type_std_dev = np.std(agent_type_list)
-            
-            xbar_income_group = np.mean(agent_income_group_list)
-            agent_income_group_std_dev = np.std(agent_income_group_list)
-
-        #check for zero standard deviation
-        if self.is_income_model:
-            if agent_type_std_dev == 0:
-                return 0
-            if agent_income_group_std_dev == 0:
-                return 0
-
-        #initialise main variables
-        numerator = 0
-        denominator = 0
-        W = 0
+        composite = self.standardised_composite()
+        if composite is None:
+            return 0
 
-        for x in range(self.grid_size):
-            for y in range(self.grid_size):
-                agent = self.grid[x, y]
-                if agent == self.empty: 
-                    continue
-
-                if self.is_income_model:
-                    agent_type = agent // 10
-                    agent_income_group = agent % 10
-                else:
-                    agent_type = agent
-
-                #standardize attributes
-                if self.is_income_model:
-                    standardised_agent_type = (agent_type - xbar_agent_type) / agent_type_std_dev
-                    standardised_agent_income_group = (agent_income_group - xbar_income_group) / agent_income_group_std_dev
-                    agent_composite = (standardised_agent_type + standardised_agent_income_group) / 2
-                else:
-                    agent_composite = (agent_type - xbar_agent_type)
-
-                #add to denominator
-                denominator += agent_composite ** 2
-                
-                neighbours = [            (x - 1, y),
-                          (x, y - 1),                 (x, y + 1),
-                                          (x + 1, y)                ]
-
-                for nx, ny in neighbours:
-                    if 0 <= nx < self.grid_size and 0 <= ny < self.grid_size:
-                        neighbour = self.grid[nx, ny]
-                        if neighbour != self.empty:
-                            W += 1
-                            if self.is_income_model:
-                                neighbour_agent_type = neighbour // 10
-                                neighbour_income_group = neighbour % 10
-                                
-                                standardised_neighbour_agent_type = (neighbour_agent_type - xbar_agent_type) / agent_type_std_dev
-                                standardised_neighbour_income_group = (neighbour_income_group - xbar_income_group) / agent_income_group_std_dev
-
-                                neighbour_composite = (standardised_neighbour_agent_type + standardised_neighbour_income_group) / 2
-                            else:
-                                neighbour_agent_type = neighbour
-                                neighbour_composite = (neighbour_agent_type - xbar_agent_type)
-
-                            numerator += agent_composite * neighbour_composite
+        numerator, denominator, W = self.morans_i_terms(composite)
 
         #caculating morans
         if W == 0 or denominator == 0:
@@ -134,83 +130,77 @@ class CompositeSegregationMeasure:
         morans_i = (num_agents * numerator) / (W * denominator)
         return morans_i
 
+    def morans_i_terms(self, composite):
+        #numerator, denominator and W (number of occupied neighbour pairs, rook by default) of moran's i
+        if self.backend == 'numba' and len(self.weights.offsets) <= MORANS_PRODUCT_LIMIT: #same summation order as below
+            return compiled.morans_i_terms(composite, self.occupied, self.weights.offset_array,
+                                           self.weights.boundary == 'torus')
+
+        denominator = sequential_sum(composite ** 2)
+
+        offsets = self.weights.offsets
+        if len(offsets) > MORANS_PRODUCT_LIMIT:
+            #empty cells have a composite of 0, so neighbourhood sums give the same terms without a pass per offset
+            numerator = sequential_sum(composite * self.weights.sum(composite))
+            occupied = self.occupied.astype(np.int64)
+            W = int(np.sum(occupied * self.weights.sum(occupied)))
+            return numerator, denominator, W
+
+        #neighbour products from shifted slices, in the order the loop visited them (up, left, right, down for rook)
+        r = self.weights.radius
+        padded_composite = self.weights.pad(composite)
+        padded_occupied = self.weights.pad(self.occupied)
+        products = np.zeros(self.grid.shape + (len(offsets),))
+        W = 0
+        for i, (dx, dy) in enumerate(offsets):
+            rows = slice(r + dx, r + dx + self.grid_size)
+            cols = slice(r + dy, r + dy + self.grid_size)
+            pairs = self.occupied & padded_occupied[rows, cols]
+            products[..., i] = np.where(pairs, composite * padded_composite[rows, cols], 0.0)
+            W += int(np.count_nonzero(pairs))
+
+        numerator = sequential_sum(products)
+        return numerator, denominator, W
+
+
+    def count_rows(self, values, groups):
+        #row: group: count, as a (rows, max group + 1) array
+        occupied_rows = np.nonzero(self.occupied)[0]
+        row_counts = np.zeros((self.grid_size, max(groups, default=0) + 1), dtype=np.int64)
+        np.add.at(row_counts, (occupied_rows, values[self.occupied]), 1)
+        return row_counts
+
+    def row_pair_differences(self, row_counts, groups):
+        if self.backend == 'numba':
+            pairs = np.array(list(combinations(groups, 2)), dtype=np.int64).reshape(-1, 2)
+            return compiled.row_pair_differences(row_counts, pairs)
+        return row_pair_differences(row_counts, groups)
+
+    def present_income_groups(self):
+        #income groups in order of first appearance, as the loop version collected them
+        present_groups, first_seen = np.unique(self.income_groups[self.occupied], return_index=True)
+        return [int(group) for group in present_groups[np.argsort(first_seen)]]
 
     def calculate_dissimilarity_index(self):
         if self.empty_ratio == 1:
             return 0
 
-        #initialise dictionaries to store counts
-        row_agent_counts = defaultdict(lambda: defaultdict(int))# row: agent type: count
-        total_agent_counts = defaultdict(int)# agent type: total count
-
-        if self.is_income_model:
-            row_income_counts = defaultdict(lambda: defaultdict(int))# row: income group: count
-            total_income_counts = defaultdict(int)# income group: total count
-
-        #counts agent types and income groups if applicable per row
-        for x in range(self.grid_size):
-            for y in range(self.grid_size):
-                agent = self.grid[x, y]
-                if agent == self.empty:  # Skip empty cells
-                    continue
-
-                # Extract agent type and income group (if applicable)
-                if self.is_income_model:
-                    agent_type = agent // 10
-                    income_group = agent % 10
-                else:
-                    agent_type = agent
-
-                # Update counts for agent types
-                row_agent_counts[x][agent_type] += 1
-                total_agent_counts[agent_type] += 1
-
-                # Update counts for income groups (if applicable)
-                if self.is_income_model:
-                    row_income_counts[x][income_group] += 1
-                    total_income_counts[income_group] += 1
+        agent_types = list(range(1, self.num_agent_types + 1))
+        agent_rows = self.count_rows(self.agent_types, agent_types)
+        if not self.is_income_model:
+            return self.dissimilarity_from_rows(agent_rows)
+        income_groups = self.present_income_groups()
+        return self.dissimilarity_from_rows(agent_rows, self.count_rows(self.income_groups, income_groups), income_groups)
 
+    def dissimilarity_from_rows(self, agent_rows, income_rows=None, income_groups=None):
         #calculates the permutation sum for each row, sums up total
         agent_types = list(range(1, self.num_agent_types + 1))
-        agent_diff_sum = 0
-        agent_permutations = 0
-
-        for row in range(self.grid_size):
-            row_agent_pairs = list(combinations(agent_types, 2))#all pair combinations
-            for (i, j) in row_agent_pairs:
-                count_i = row_agent_counts[row].get(i, 0)
-                count_j = row_agent_counts[row].get(j, 0)
-                total_i = total_agent_counts[i]
-                total_j = total_agent_counts[j]
-
-                if count_i == 0 or count_j == 0:
-                    continue #skips if region does not have the agent type
-
-                diff = abs((count_i / total_i) - (count_j / total_j))
-                agent_diff_sum += diff
-                agent_permutations += 1
+        agent_diff_sum, agent_permutations = self.row_pair_differences(agent_rows, agent_types)
         agent_diff_sum /= agent_permutations
 
         #if applicable calculates the permutation sum for each row, sums up total
         if self.is_income_model:
-            income_groups = list(total_income_counts.keys())
-            income_diff_sum = 0
-            income_permutations = 0
-
-            for row in range(self.grid_size):
-                row_income_pairs = list(combinations(income_groups, 2))  
-                for (i, j) in row_income_pairs:
-                    count_i = row_income_counts[row].get(i, 0)
-                    count_j = row_income_counts[row].get(j, 0)
-                    total_i = total_income_counts[i]
-                    total_j = total_income_counts[j]
-
-                    if count_i == 0 or count_j == 0:
-                        continue #skips if region does not have the income group
-
-                    diff = abs((count_i / total_i) - (count_j / total_j))
-                    income_diff_sum += diff
-                    income_permutations += 1
+            income_diff_sum, income_permutations = self.row_pair_differences(income_rows, income_groups)
             income_diff_sum /= income_permutations
 
         if self.is_income_model:
@@ -221,17 +211,19 @@ class CompositeSegregationMeasure:
 
 
     def calculate_composite_segregation_measure(self):
+        return self.composite_from_indices(self.calculate_isolation_index(), self.calculate_morans_i(),
+                                           self.calculate_dissimilarity_index())
+
+    def composite_from_indices(self, isolation_index, morans_i, dissimilarity_index):
+        #the component indices and the two composite axes, as plain floats
         #x-axis
-        isolation_index = self.calculate_isolation_index()
         exposure_index = 1 - isolation_index
 
         composite_x_axis = exposure_index - isolation_index if isolation_index else 0
 
         #y-axis
-        morans_i = self.calculate_morans_i()
-        dissimilarity_index = self.calculate_dissimilarity_index()
-
         composite_y_axis = dissimilarity_index - morans_i
 
-        composite_segregation_measure = f'({composite_x_axis:.5f} , {composite_y_axis:.5f})'
-        return composite_segregation_measure
+        return {'isolation_index': float(isolation_index), 'morans_i': float(morans_i),
+                'dissimilarity_index': float(dissimilarity_index), 'composite_x': float(composite_x_axis),
+                'composite_y': float(composite_y_axis)}
@@ -0,0 +1,48 @@
+from .composite_segregation_measure import CompositeSegregationMeasure
+
+
+class MeasureCache:
+    #segregation measures of a model's grid, each computed at most once per grid version
+    def __init__(self, model, backend='python'):
+        self.model = model
+        self.backend = backend
+        self.version = None
+        self.measure = None
+        self.values = {}
+
+    def current_measure(self):
+        if self.version != self.model.grid_version:
+            from models import SchellingIncomeModel
+            model = self.model
+            #the isolation index is the mean of the satisfaction field the model keeps anyway
+            self.measure = CompositeSegregationMeasure(model.grid.copy(), model.num_agent_types, model.empty_ratio,
+                                                       isinstance(model, SchellingIncomeModel), backend=self.backend,
+                                                       satisfaction=model.satisfaction_ratios(),
+                                                       **model.neighbourhood.parameters())
+            self.version = model.grid_version
+            self.values = {}
+        return self.measure
+
+    def get(self, name):
+        #name is a CompositeSegregationMeasure method, e.g. 'calculate_morans_i'
+        measure = self.current_measure()
+        if name not in self.values:
+            self.values[name] = getattr(measure, name)()
+        return self.values[name]
+
+    def isolation_index(self):
+        return self.get('calculate_isolation_index')
+
+    def morans_i(self):
+        return self.get('calculate_morans_i')
+
+    def dissimilarity_index(self):
+        return self.get('calculate_dissimilarity_index')
+
+    def composite_segregation_measure(self):
+        #indices and composite axes as a dict, built from the cached indices rather than recomputing them
+        measure = self.current_measure() #clears the cached values first if the grid has changed
+        if 'composite' not in self.values:
+            self.values['composite'] = measure.composite_from_indices(
+                self.isolation_index(), self.morans_i(), self.dissimilarity_index())
+        return self.values['composite']
@@ -0,0 +1,146 @@
+import numpy as np
+from models.schelling_model import RESCAN_SHARE
+from utils import TYPE_OF_CODE, INCOME_OF_CODE
+from .composite_segregation_measure import CompositeSegregationMeasure, row_pair_differences
+
+
+class MeasureTracker:
+    #keeps isolation, moran's i and dissimilarity up to date round by round from the cells around the round's moves,
+    #and records them
+    def __init__(self, model):
+        self.model = model
+        model.measure_tracker = self
+        self.reset()
+
+    def reset(self):
+        #full computation for the current grid, clears the recorded series
+        self.refresh()
+        self.isolation_series = []
+        self.morans_i_series = []
+        self.dissimilarity_series = []
+        self.record_round()
+
+    def refresh(self):
+        #full computation for the current grid, keeps the recorded series (after a batch of moves)
+        from models import SchellingIncomeModel
+        model = self.model
+        self.is_income_model = isinstance(model, SchellingIncomeModel)
+        measure = CompositeSegregationMeasure(model.grid, model.num_agent_types, model.empty_ratio, self.is_income_model,
+                                              **model.neighbourhood.parameters())
+        self.weights = measure.weights
+        self.grid_cells = model.grid_size ** 2
+        self.active = model.empty_ratio != 1 #the measure returns 0 for everything when the grid is empty
+
+        #isolation: sum of the satisfaction field over every cell
+        self.satisfaction = model.satisfaction_ratios().copy()
+        self.isolation_sum = float(np.sum(self.satisfaction))
+
+        #moran's i: agents keep their attributes, so the composites and the denominator never change
+        self.num_agents = self.grid_cells - int(self.grid_cells * model.empty_ratio)
+        composite = measure.standardised_composite() if self.active else None
+        self.has_variation = composite is not None
+        self.composite = composite if self.has_variation else np.zeros(model.grid.shape)
+        self.occupied = measure.occupied.copy()
+        self.numerator, self.denominator, self.W = measure.morans_i_terms(self.composite)
+        #an agent's composite only depends on its code, empty cells (code -1, 255 wrapped) stay 0
+        self.composite_of_code = np.zeros(256)
+        self.composite_of_code[model.grid[self.occupied].astype(np.uint8)] = self.composite[self.occupied]
+
+        #dissimilarity: per-row counts of every agent type and income group
+        self.agent_type_groups = list(range(1, model.num_agent_types + 1))
+        self.agent_row_counts = measure.count_rows(measure.agent_types, self.agent_type_groups)
+        if self.is_income_model:
+            self.income_group_order = measure.present_income_groups()
+            self.income_row_counts = measure.count_rows(measure.income_groups, self.income_group_order)
+
+    def decode(self, agents):
+        if not self.is_income_model:
+            return agents.astype(np.int64), np.zeros(len(agents), dtype=np.int64)
+        return (np.take(TYPE_OF_CODE, agents, mode='wrap').astype(np.int64),
+                np.take(INCOME_OF_CODE, agents, mode='wrap').astype(np.int64))
+
+    def neighbour_sums(self, values, rows, cols):
+        #sum of values over the neighbours (rook by default) of each cell
+        size = self.model.grid_size
+        neighbour_rows = rows[:, np.newaxis] + self.weights.offset_array[:, 0]
+        neighbour_cols = cols[:, np.newaxis] + self.weights.offset_array[:, 1]
+        if self.weights.boundary == 'torus':
+            return values[neighbour_rows % size, neighbour_cols % size].sum(axis=1)
+        inside = (neighbour_rows >= 0) & (neighbour_rows < size) & (neighbour_cols >= 0) & (neighbour_cols < size)
+        neighbours = values[np.clip(neighbour_rows, 0, size - 1), np.clip(neighbour_cols, 0, size - 1)]
+        return np.where(inside, neighbours, 0).sum(axis=1)
+
+    def morans_i_window_terms(self, rows, cols):
+        #the cells' share of the numerator and W, each neighbour pair counted from both ends
+        numerator = float(np.sum(self.composite[rows, cols] * self.neighbour_sums(self.composite, rows, cols)))
+        occupied = self.occupied.astype(np.int64)
+        return numerator, int(np.sum(occupied[rows, cols] * self.neighbour_sums(occupied, rows, cols)))
+
+    def record_moves(self, sources, destinations):
+        #brings the measures up to date after a round of moves, (n, 2) arrays of cells, or fully once the cells around
+        #them cover a large share of the grid; the model's grid (and its count planes, if it keeps them) have to be
+        #up to date
+        model = self.model
+        cells = np.vstack([sources, destinations])
+        if len(cells) * len(model.neighbourhood.reach) >= RESCAN_SHARE * model.grid.size:
+            self.refresh()
+            return
+
+        #every agent is at its destination at the end of a round
+        agent_types, income_groups = self.decode(model.grid[destinations[:, 0], destinations[:, 1]])
+        np.add.at(self.agent_row_counts, (sources[:, 0], agent_types), -1)
+        np.add.at(self.agent_row_counts, (destinations[:, 0], agent_types), 1)
+        if self.is_income_model:
+            np.add.at(self.income_row_counts, (sources[:, 0], income_groups), -1)
+            np.add.at(self.income_row_counts, (destinations[:, 0], income_groups), 1)
+
+        rows, cols = model.neighbourhood.reach_cells(cells, model.grid_size)
+        satisfaction = model.satisfaction_from_counts(model.grid[rows, cols], model.cell_neighbour_counts(rows, cols))
+        self.isolation_sum += float(np.sum(satisfaction)) - float(np.sum(self.satisfaction[rows, cols]))
+        self.satisfaction[rows, cols] = satisfaction
+
+        #the pairs that changed all have an end among the moved cells or their neighbours
+        rows, cols = self.weights.reach_cells(cells, model.grid_size)
+        numerator, W = self.morans_i_window_terms(rows, cols)
+        agents = model.grid[cells[:, 0], cells[:, 1]]
+        self.composite[cells[:, 0], cells[:, 1]] = np.take(self.composite_of_code, agents, mode='wrap')
+        self.occupied[cells[:, 0], cells[:, 1]] = agents != model.empty
+        new_numerator, new_W = self.morans_i_window_terms(rows, cols)
+        self.numerator += new_numerator - numerator
+        self.W += new_W - W
+
+    def isolation_index(self):
+        return self.isolation_sum / self.grid_cells if self.active else 0
+
+    def morans_i(self):
+        if not self.active or not self.has_variation or self.W == 0 or self.denominator == 0:
+            return 0
+        return (self.num_agents * self.numerator) / (self.W * self.denominator)
+
+    def dissimilarity_index(self):
+        #nan where the full measure would divide by zero, so a run never stops on it
+        if not self.active:
+            return 0
+        agent_diff_sum, agent_permutations = row_pair_differences(self.agent_row_counts, self.agent_type_groups)
+        if agent_permutations == 0:
+            return np.nan
+        if not self.is_income_model:
+            return (agent_diff_sum / agent_permutations) / 2
+
+        income_diff_sum, income_permutations = row_pair_differences(self.income_row_counts, self.income_group_order)
+        if income_permutations == 0:
+            return np.nan
+        return (agent_diff_sum / agent_permutations + income_diff_sum / income_permutations) / 4
+
+    def record_round(self):
+        self.isolation_series.append(self.isolation_index())
+        self.morans_i_series.append(self.morans_i())
+        self.dissimilarity_series.append(self.dissimilarity_index())
+
+    def series(self):
+        #per-round values, index 0 is the grid before the first round
+        return {
+            'isolation_index': np.array(self.isolation_series),
+            'morans_i': np.array(self.morans_i_series),
+            'dissimilarity_index': np.array(self.dissimilarity_series),
+        }
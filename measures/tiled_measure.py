@@ -0,0 +1,142 @@
+import numpy as np
+from models import compiled, SchellingIncomeModel
+from models.neighbourhood import Neighbourhood
+from utils import decode_cells
+from .composite_segregation_measure import CompositeSegregationMeasure, MORANS_PRODUCT_LIMIT, sequential_sum
+
+
+MORANS_BLOCK_VALUES = 2 ** 17 #neighbour products moran's i holds at once per strip
+
+def carry_sum(total, values):
+    #sequential_sum carried on from an earlier total, summing strip after strip adds in the whole grid's order
+    return sequential_sum(np.concatenate([[total], np.ravel(values)]))
+
+
+class TiledSegregationMeasure(CompositeSegregationMeasure):
+    #CompositeSegregationMeasure of a TiledSchellingModel's grid, read a strip (plus its halo rows) at a time
+    #dissimilarity and moran's i add up in the in-memory order so they come out the same, except that the isolation
+    #index, the income model's standard deviations and moran's i past radius 4 (fft sums, which depend on the array
+    #shape) are summed per strip and can differ from the in-memory values in the last bits
+    def __init__(self, model, backend='python'):
+        self.model = model
+        self.grid_size = model.grid_size
+        self.empty = model.empty
+        self.num_agent_types = model.num_agent_types
+        self.empty_ratio = model.empty_ratio
+        self.is_income_model = isinstance(model.template, SchellingIncomeModel)
+        self.backend = compiled.resolve_backend(backend)
+        self.neighbourhood = model.neighbourhood
+        self.weights = Neighbourhood(self.neighbourhood.radius, 'von_neumann', self.neighbourhood.boundary)
+
+    def strips(self):
+        #decoded planes of every strip, halo rows included, and where the strip's own rows are in them
+        for start, stop in self.model.strips():
+            halo, top = self.model.read_strip(start, stop)
+            yield start, slice(top, top + stop - start), decode_cells(halo, self.is_income_model)
+
+    def calculate_isolation_index(self):
+        if self.empty_ratio == 1:
+            return 0
+        return self.model.satisfaction_sum() / self.grid_size ** 2
+
+    def composite_statistics(self):
+        #mean and standard deviation of the agent types and income groups, from counts of every value
+        type_counts = np.zeros(self.num_agent_types + 1, dtype=np.int64)
+        income_counts = np.zeros(6, dtype=np.int64)
+        for _, rows, (occupied, agent_types, income_groups) in self.strips():
+            type_counts += np.bincount(agent_types[rows][occupied[rows]], minlength=len(type_counts))
+            income_counts += np.bincount(income_groups[rows][occupied[rows]], minlength=len(income_counts))
+
+        statistics = []
+        for counts in (type_counts, income_counts):
+            values = np.arange(len(counts))
+            num_agents = int(counts.sum())
+            mean = int((values * counts).sum()) / num_agents
+            statistics.append((mean, np.sqrt(float((counts * (values - mean) ** 2).sum()) / num_agents)))
+        return statistics
+
+    def strip_composite(self, planes, statistics):
+        #the planes' part of standardised_composite
+        occupied, agent_types, income_groups = planes
+        (xbar_agent_type, agent_type_std_dev), (xbar_income_group, agent_income_group_std_dev) = statistics
+        if not self.is_income_model:
+            return np.where(occupied, agent_types - xbar_agent_type, 0.0)
+        standardised_agent_type = (agent_types - xbar_agent_type) / agent_type_std_dev
+        standardised_agent_income_group = (income_groups - xbar_income_group) / agent_income_group_std_dev
+        return np.where(occupied, (standardised_agent_type + standardised_agent_income_group) / 2, 0.0)
+
+    def calculate_morans_i(self):
+        if self.empty_ratio == 1:
+            return 0
+
+        total_cells = self.grid_size ** 2
+        num_empty = int(total_cells * self.empty_ratio)
+        num_agents = total_cells - num_empty
+
+        statistics = self.composite_statistics()
+        if self.is_income_model and (statistics[0][1] == 0 or statistics[1][1] == 0):
+            return 0
+
+        numerator, denominator, W = 0.0, 0.0, 0
+        for _, rows, planes in self.strips():
+            composite = self.strip_composite(planes, statistics)
+            numerator, strip_W = self.strip_morans_i_terms(composite, planes[0], rows, numerator)
+            denominator = carry_sum(denominator, composite[rows] ** 2)
+            W += strip_W
+
+        if W == 0 or denominator == 0:
+            return 0
+
+        morans_i = (num_agents * numerator) / (W * denominator)
+        return morans_i
+
+    def strip_morans_i_terms(self, composite, occupied, rows, numerator):
+        #morans_i_terms for the strip's rows, the halo rows stand in for the padding above and below
+        offsets = self.weights.offsets
+        inner_composite, inner_occupied = composite[rows], occupied[rows]
+        if len(offsets) > MORANS_PRODUCT_LIMIT:
+            numerator = carry_sum(numerator, inner_composite * self.weights.sum(composite)[rows])
+            neighbours = self.weights.sum(occupied.astype(np.int64))[rows]
+            return numerator, int(np.sum(inner_occupied * neighbours))
+
+        #products of a block of rows at a time, summed on in the whole grid's order, so memory doesn't grow with the
+        #strip size times the number of offsets
+        r = self.weights.radius
+        padded_composite = self.weights.pad(composite)
+        padded_occupied = self.weights.pad(occupied)
+        block_rows = max(1, MORANS_BLOCK_VALUES // (self.grid_size * len(offsets)))
+        W = 0
+        for start in range(rows.start, rows.stop, block_rows):
+            stop = min(start + block_rows, rows.stop)
+            block_composite, block_occupied = composite[start:stop], occupied[start:stop]
+            products = np.zeros(block_composite.shape + (len(offsets),))
+            for i, (dx, dy) in enumerate(offsets):
+                neighbour_rows = slice(start + r + dx, stop + r + dx)
+                cols = slice(r + dy, r + dy + self.grid_size)
+                pairs = block_occupied & padded_occupied[neighbour_rows, cols]
+                products[..., i] = np.where(pairs, block_composite * padded_composite[neighbour_rows, cols], 0.0)
+                W += int(np.count_nonzero(pairs))
+            numerator = carry_sum(numerator, products)
+        return numerator, W
+
+    def calculate_dissimilarity_index(self):
+        if self.empty_ratio == 1:
+            return 0
+
+        #per-row counts are only grid_size rows long, so they're built whole from the strips
+        agent_rows = np.zeros((self.grid_size, self.num_agent_types + 1), dtype=np.int64)
+        income_rows = np.zeros((self.grid_size, 6), dtype=np.int64)
+        first_seen = {}
+        for start, rows, (occupied, agent_types, income_groups) in self.strips():
+            occupied, agent_types, income_groups = occupied[rows], agent_types[rows], income_groups[rows]
+            occupied_rows = np.nonzero(occupied)[0] + start
+            np.add.at(agent_rows, (occupied_rows, agent_types[occupied]), 1)
+            np.add.at(income_rows, (occupied_rows, income_groups[occupied]), 1)
+            present_groups, first_index = np.unique(income_groups[occupied], return_index=True)
+            for group, index in zip(present_groups.tolist(), first_index.tolist()):
+                first_seen.setdefault(group, (start, index))
+
+        if not self.is_income_model:
+            return self.dissimilarity_from_rows(agent_rows)
+        income_groups = sorted(first_seen, key=first_seen.get) #in order of first appearance, as present_income_groups
+        return self.dissimilarity_from_rows(agent_rows, income_rows, income_groups)
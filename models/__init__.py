@@ -1,4 +1,13 @@
 from .schelling_model import SchellingModel
 from .schelling_income_model import SchellingIncomeModel
+from .schelling_ensemble import SchellingEnsemble
+from .tiled_model import TiledSchellingModel
+from .parallel_model import ParallelSchellingModel
+from .trajectory import TrajectoryRecorder, Trajectory
+from .checkpoint import save_checkpoint, load_checkpoint
+from .convergence import ConvergenceDetector
+from .relocation import RelocationPolicy, RandomRelocation, BestOfKRelocation, NearestSatisfyingRelocation
 
-__all__ = ['SchellingModel', 'SchellingIncomeModel']
+__all__ = ['SchellingModel', 'SchellingIncomeModel', 'SchellingEnsemble', 'TiledSchellingModel', 'ParallelSchellingModel',
+           'TrajectoryRecorder', 'Trajectory', 'save_checkpoint', 'load_checkpoint', 'ConvergenceDetector',
+           'RelocationPolicy', 'RandomRelocation', 'BestOfKRelocation', 'NearestSatisfyingRelocation']
@@ -0,0 +1,62 @@
+import inspect
+import json
+import numpy as np
+from .schelling_model import SchellingModel
+from .schelling_income_model import SchellingIncomeModel
+from .relocation import RELOCATION_POLICIES
+from utils import CellSet, ArrayCellSet
+
+
+MODEL_CLASSES = {'SchellingModel': SchellingModel, 'SchellingIncomeModel': SchellingIncomeModel}
+
+
+def constructor_arguments(instance, excluded=()):
+    #values of the constructor arguments, read back from the attributes of the same name
+    names = set(inspect.signature(type(instance).__init__).parameters) - {'self'} - set(excluded)
+    return {name: getattr(instance, name) for name in sorted(names) if hasattr(instance, name)}
+
+
+def relocation_spec(policy):
+    name = next(name for name, policy_class in RELOCATION_POLICIES.items() if type(policy) is policy_class)
+    return {'name': name, 'arguments': constructor_arguments(policy)}
+
+
+def save_checkpoint(model, path):
+    #everything step() depends on: parameters, grid, rng state and the order of the vacancy and dissatisfied sets
+    metadata = {
+        'model': type(model).__name__,
+        'parameters': constructor_arguments(model, excluded=('seed', 'relocation')),
+        'relocation': relocation_spec(model.relocation),
+        'rng_state': model.rng.bit_generator.state,
+    }
+    np.savez_compressed(path, grid=model.grid,
+                        empty_cells=model.empty_cells.as_array(),
+                        dissatisfied_agents=np.array(list(model.dissatisfied_agents), dtype=np.int64).reshape(-1, 2),
+                        metadata=np.array(json.dumps(metadata, default=np.ndarray.tolist)))
+
+
+def load_checkpoint(path):
+    #rebuilds the model and restores its state, stepping it continues exactly where the saved model was
+    with np.load(path, allow_pickle=False) as data:
+        metadata = json.loads(str(data['metadata']))
+        grid = data['grid']
+        empty_cells = data['empty_cells']
+        dissatisfied_agents = [tuple(cell) for cell in data['dissatisfied_agents'].tolist()]
+
+    relocation = metadata['relocation']
+    policy = RELOCATION_POLICIES[relocation['name']](**relocation['arguments'])
+    model_class = MODEL_CLASSES[metadata['model']]
+    parameters = dict(metadata['parameters'], grid_size=grid.shape[0])
+    model = model_class(relocation=policy, **parameters)
+
+    model.grid = grid
+    bit_generator = getattr(np.random, metadata['rng_state']['bit_generator'])() #same kind as the saved one
+    bit_generator.state = metadata['rng_state']
+    model.rng = np.random.Generator(bit_generator)
+    if isinstance(model.empty_cells, ArrayCellSet):
+        model.empty_cells = ArrayCellSet(grid.shape, empty_cells)
+    else:
+        model.empty_cells = CellSet(tuple(cell) for cell in empty_cells.tolist())
+    model.update_dissatisfied_agents() #rebuilds the neighbour counts
+    model.dissatisfied_agents = CellSet(dissatisfied_agents) if model.incremental else dissatisfied_agents
+    return model
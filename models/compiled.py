@@ -0,0 +1,140 @@
+import warnings
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError: #numba is optional, the kernels then stay plain python and the models use the numpy path
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+
+BACKENDS = ('python', 'numba')
+
+
+def resolve_backend(backend):
+    #falls back to the python backend (with a warning) when numba isn't installed
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}, expected one of {BACKENDS}")
+    if backend == 'numba' and not NUMBA_AVAILABLE:
+        warnings.warn("numba is not installed, using the python backend", RuntimeWarning)
+        return 'python'
+    return backend
+
+
+def backend_kernel(kernel, backend):
+    #the compiled kernel for the numba backend, the same function run as plain python otherwise
+    return kernel if backend == 'numba' else getattr(kernel, 'py_func', kernel)
+
+
+@njit(cache=True)
+def update_counts(counts, x, y, layers, change, offsets, torus):
+    #same as SchellingModel.update_neighbour_counts, for the neighbourhood given by its offsets
+    size = counts.shape[1]
+    for layer in range(layers.shape[0]):
+        if not layers[layer]:
+            continue
+        for k in range(offsets.shape[0]):
+            nx, ny = x + offsets[k, 0], y + offsets[k, 1]
+            if torus:
+                nx, ny = nx % size, ny % size
+            elif nx < 0 or nx >= size or ny < 0 or ny >= size:
+                continue
+            counts[layer, nx, ny] += change
+
+
+@njit(cache=True)
+def take_vacancy(pool, positions, pool_size, index, x, y):
+    #the vacancy pool is updated like CellSet: discard(vacancy) swaps the last cell into the gap, add(x, y) appends
+    ex, ey = pool[index, 0], pool[index, 1]
+    last = pool_size - 1
+    positions[ex, ey] = -1
+    if index < last:
+        pool[index, 0], pool[index, 1] = pool[last, 0], pool[last, 1]
+        positions[pool[index, 0], pool[index, 1]] = index
+    pool[last, 0], pool[last, 1] = x, y
+    positions[x, y] = last
+    return ex, ey
+
+
+@njit(cache=True)
+def relocate_random(grid, movers, draws, pool, positions, pool_size, empty, counts, layer_table, track_counts,
+                    offsets, torus, destinations):
+    #one round of random relocation, each mover takes the vacancy picked by its draw in turn
+    #destinations gets the cell each mover went to, for the trajectory recorder
+    moves = 0
+    for m in range(movers.shape[0]):
+        if pool_size == 0:
+            break
+        x, y = movers[m, 0], movers[m, 1]
+        ex, ey = take_vacancy(pool, positions, pool_size, int(draws[m] * pool_size), x, y)
+        destinations[m, 0], destinations[m, 1] = ex, ey
+
+        agent = grid[x, y]
+        grid[ex, ey] = agent
+        grid[x, y] = empty
+
+        if track_counts:
+            update_counts(counts, x, y, layer_table[agent], -1, offsets, torus)
+            update_counts(counts, ex, ey, layer_table[agent], 1, offsets, torus)
+        moves += 1
+    return moves
+
+
+@njit(cache=True)
+def allocate_vacancies(movers, draws, pool, positions, pool_size, destinations):
+    #relocate_random's choice of vacancies without touching the grid, the moves are applied afterwards
+    for m in range(movers.shape[0]):
+        destinations[m, 0], destinations[m, 1] = take_vacancy(pool, positions, pool_size,
+                                                              int(draws[m] * pool_size), movers[m, 0], movers[m, 1])
+
+
+@njit(cache=True)
+def morans_i_terms(composite, occupied, offsets, torus):
+    #loop version of CompositeSegregationMeasure.morans_i_terms, summed in the same order so the floats match
+    size = composite.shape[0]
+    denominator = 0.0
+    for x in range(size):
+        for y in range(size):
+            denominator += composite[x, y] ** 2
+
+    numerator = 0.0
+    W = 0
+    for x in range(size):
+        for y in range(size):
+            if not occupied[x, y]:
+                continue
+            for k in range(offsets.shape[0]): #up, left, right, down for rook
+                nx, ny = x + offsets[k, 0], y + offsets[k, 1]
+                if torus:
+                    nx, ny = nx % size, ny % size
+                elif nx < 0 or nx >= size or ny < 0 or ny >= size:
+                    continue
+                if occupied[nx, ny]:
+                    numerator += composite[x, y] * composite[nx, ny]
+                    W += 1
+    return numerator, denominator, W
+
+
+@njit(cache=True)
+def row_pair_differences(row_counts, pairs):
+    #loop version of row_pair_differences, rows outer and pairs inner
+    total_counts = row_counts.sum(axis=0)
+    diff_sum = 0.0
+    permutations = 0
+    for row in range(row_counts.shape[0]):
+        for k in range(pairs.shape[0]):
+            i, j = pairs[k, 0], pairs[k, 1]
+            if row_counts[row, i] != 0 and row_counts[row, j] != 0:
+                diff_sum += abs(row_counts[row, i] / total_counts[i] - row_counts[row, j] / total_counts[j])
+                permutations += 1
+    return diff_sum, permutations
+
+
+def layer_table(model):
+    #row per agent code (0 to 127), column per count layer it counts towards
+    return np.ascontiguousarray(model.layer_masks(np.arange(128, dtype=np.int8)).T)
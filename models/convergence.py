@@ -0,0 +1,97 @@
+import hashlib
+from collections import deque
+import numpy as np
+
+
+SERIES = ('dissatisfied', 'satisfaction', 'isolation_index', 'morans_i', 'dissimilarity_index')
+
+
+class ConvergenceDetector:
+    #ends runs that never settle: step() returns False once none of the tracked series has set a new low or high for
+    #window rounds ('plateau'), or when the grid comes back to a state it was in before ('cycle'),
+    #model.termination_reason says which
+    #a new extreme has to beat the old one by tolerance times the value (or times 1 for values smaller than that), so
+    #the noise of agents shuffling forever without getting anywhere soon stops counting as progress
+    def __init__(self, model, window=50, tolerance=0.001, track=('satisfaction',), detect_cycles=True, cycle_memory=1000):
+        for name in track:
+            if name not in SERIES:
+                raise ValueError(f"unknown series {name!r}, expected one of {SERIES}")
+        self.model = model
+        self.window = window
+        self.tolerance = tolerance
+        self.track = tuple(track)
+        self.detect_cycles = detect_cycles
+        self.cycle_memory = cycle_memory #rounds a grid state is remembered for
+        self.message = None #what ended the run last, for display
+        model.convergence_detector = self
+        self.reset()
+
+    def reset(self):
+        self.rounds = 0
+        self.extremes = {} #series: [lowest, highest, rounds since either last moved]
+        self.seen = {} #state hash: round it was last seen in
+        self.recent = deque() #(round, hash) in order, so old states can be forgotten
+        self.measure_cache = None
+        self.remember(self.state_hash())
+
+    def state_hash(self):
+        #8-byte digest of the grid, cheap next to a round's satisfaction rescan
+        return hashlib.blake2b(np.ascontiguousarray(self.model.grid).data, digest_size=8).digest()
+
+    def remember(self, state):
+        self.seen[state] = self.rounds
+        self.recent.append((self.rounds, state))
+        while self.recent[0][0] <= self.rounds - self.cycle_memory:
+            old_round, old_state = self.recent.popleft()
+            if self.seen.get(old_state) == old_round:
+                del self.seen[old_state]
+
+    def value(self, name):
+        if name == 'dissatisfied':
+            return len(self.model.dissatisfied_agents)
+        if name == 'satisfaction':
+            return self.model.calculate_satisfaction()
+        if self.measure_cache is None:
+            from measures import MeasureCache
+            self.measure_cache = MeasureCache(self.model)
+        try:
+            return getattr(self.measure_cache, name)()
+        except ZeroDivisionError: #e.g. the dissimilarity index with a single income group, as runner.measure_values
+            return np.nan
+
+    def is_stale(self, name, value):
+        #whether the series has gone window rounds without a new extreme, value included
+        if np.isnan(value):
+            return False #an undefined value never counts towards a plateau
+        if name not in self.extremes:
+            self.extremes[name] = [value, value, 0]
+            return False
+        extremes = self.extremes[name]
+        margin = self.tolerance * max(abs(value), 1.0)
+        if value < extremes[0] - margin or value > extremes[1] + margin:
+            extremes[0], extremes[1], extremes[2] = min(extremes[0], value), max(extremes[1], value), 0
+        else:
+            extremes[2] += 1
+        return extremes[2] >= self.window
+
+    def update(self):
+        #called after every round that moved agents, returns 'plateau' or 'cycle' to end the run, otherwise None
+        self.rounds += 1
+        state = self.state_hash()
+        #a round that left the grid as it was (a synchronous deal can hand every mover its own cell) isn't a cycle,
+        #the plateau test still ends runs that stay there
+        if self.detect_cycles and state in self.seen and self.seen[state] < self.rounds - 1:
+            previous = self.seen[state]
+            return self.finish('cycle', f"grid repeats round {previous}, {self.rounds - previous} rounds ago")
+        self.remember(state)
+
+        stale = [self.is_stale(name, self.value(name)) for name in self.track] #every series is updated each round
+        if self.track and all(stale):
+            return self.finish('plateau', f"no new extreme of {', '.join(self.track)} in {self.window} rounds")
+        return None
+
+    def finish(self, reason, message):
+        #a run stepped on past this point is watched afresh
+        self.reset()
+        self.message = message
+        return reason
@@ -0,0 +1,139 @@
+import numpy as np
+
+
+SHAPES = ('moore', 'von_neumann')
+BOUNDARIES = ('clip', 'torus')
+SHIFTED_SUM_LIMIT = 48 #up to this many offsets (radius 3 moore) adding shifted slices beats the table/fft set-up
+
+
+class Neighbourhood:
+    #cells within radius of a cell: a square (moore) or a diamond (von neumann), cut off at the grid edge (clip)
+    #or wrapping around it (torus)
+    def __init__(self, radius=1, shape='moore', boundary='clip'):
+        if radius < 1:
+            raise ValueError("radius must be at least 1")
+        if shape not in SHAPES:
+            raise ValueError(f"unknown neighbourhood shape {shape!r}, expected one of {SHAPES}")
+        if boundary not in BOUNDARIES:
+            raise ValueError(f"unknown boundary {boundary!r}, expected one of {BOUNDARIES}")
+        self.radius = radius
+        self.shape = shape
+        self.boundary = boundary
+
+        #row-major, so radius 1 gives the order is_satisfied always used
+        self.offsets = [(dx, dy) for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1)
+                        if (dx, dy) != (0, 0) and (shape == 'moore' or abs(dx) + abs(dy) <= radius)]
+        self.offset_array = np.array(self.offsets, dtype=np.int64)
+        self.reach = np.vstack([self.offset_array, [(0, 0)]]) #offsets plus the cell itself
+
+        #neighbour counts need to hold len(offsets)
+        self.count_dtype = np.int8 if len(self.offsets) <= 127 else np.int16
+
+    def parameters(self):
+        #as the models' and CompositeSegregationMeasure's keyword arguments
+        return {'radius': self.radius, 'neighbourhood_shape': self.shape, 'boundary': self.boundary}
+
+    def check_grid(self, grid_size):
+        #on a torus a wider neighbourhood would reach some cells twice
+        if self.boundary == 'torus' and 2 * self.radius + 1 > grid_size:
+            raise ValueError(f"a torus neighbourhood of radius {self.radius} needs a grid of at least "
+                             f"{2 * self.radius + 1} cells")
+
+    def pad(self, planes):
+        #pads the last two axes by the radius, with zeros or with the opposite edge of the grid
+        padding = [(0, 0)] * (planes.ndim - 2) + [(self.radius, self.radius)] * 2
+        return np.pad(planes, padding, mode='wrap' if self.boundary == 'torus' else 'constant')
+
+    def sum(self, planes):
+        #sum over the neighbourhood of every cell over the last two axes, the cell itself not included
+        #integer planes keep their dtype, so pass them in count_dtype
+        planes = np.asarray(planes)
+        if len(self.offsets) <= SHIFTED_SUM_LIMIT:
+            return self.shifted_sum(planes)
+        if self.shape == 'moore':
+            return self.summed_area_sum(planes)
+        return self.fft_sum(planes)
+
+    def shifted_sum(self, planes):
+        rows, cols = planes.shape[-2:]
+        padded = self.pad(planes)
+        r = self.radius
+        total = np.zeros(planes.shape, dtype=planes.dtype)
+        for dx, dy in self.offsets:
+            total += padded[..., r + dx:r + dx + rows, r + dy:r + dy + cols]
+        return total
+
+    def summed_area_sum(self, planes):
+        #square windows from a summed-area table: four lookups per cell whatever the radius
+        rows, cols = planes.shape[-2:]
+        padded = self.pad(planes)
+        accumulator = np.int64 if np.issubdtype(planes.dtype, np.integer) else np.float64
+        table = np.zeros(padded.shape[:-2] + (padded.shape[-2] + 1, padded.shape[-1] + 1), dtype=accumulator)
+        table[..., 1:, 1:] = padded.cumsum(axis=-2, dtype=accumulator).cumsum(axis=-1)
+        width = 2 * self.radius + 1
+        window = (table[..., width:width + rows, width:width + cols] - table[..., :rows, width:width + cols]
+                  - table[..., width:width + rows, :cols] + table[..., :rows, :cols])
+        return (window - planes).astype(planes.dtype)
+
+    def fft_sum(self, planes):
+        #diamond windows as an fft convolution, the padding keeps the circular convolution from wrapping
+        rows, cols = planes.shape[-2:]
+        padded = self.pad(planes).astype(np.float64)
+        width = 2 * self.radius + 1
+        kernel = np.zeros((width, width))
+        kernel[self.offset_array[:, 0] + self.radius, self.offset_array[:, 1] + self.radius] = 1
+        shape = padded.shape[-2:]
+        total = np.fft.irfft2(np.fft.rfft2(padded) * np.fft.rfft2(kernel, s=shape), s=shape)
+        window = total[..., width - 1:width - 1 + rows, width - 1:width - 1 + cols]
+        if np.issubdtype(planes.dtype, np.integer):
+            return np.rint(window).astype(planes.dtype)
+        return window
+
+    def neighbour_list(self, x, y, size):
+        #neighbours of one cell, wrapped on a torus, left for the caller to bounds check otherwise
+        if self.boundary == 'torus':
+            return [((x + dx) % size, (y + dy) % size) for dx, dy in self.offsets]
+        return [(x + dx, y + dy) for dx, dy in self.offsets]
+
+    def window(self, x, y, size):
+        #index of the cell and its neighbours, slices for a clipped square so updates stay cheap
+        if self.shape == 'moore' and self.boundary == 'clip':
+            return slice(max(x - self.radius, 0), x + self.radius + 1), slice(max(y - self.radius, 0), y + self.radius + 1)
+        return self.window_cells(x, y, size)
+
+    def window_cells(self, x, y, size):
+        #rows and columns of the cells window() covers, in the order indexing with it gives them
+        if self.shape == 'moore' and self.boundary == 'clip':
+            rows, cols = self.window(x, y, size)
+            rows, cols = np.meshgrid(np.arange(rows.start, min(rows.stop, size)),
+                                     np.arange(cols.start, min(cols.stop, size)), indexing='ij')
+            return rows.ravel(), cols.ravel()
+        rows, cols = x + self.reach[:, 0], y + self.reach[:, 1]
+        if self.boundary == 'torus':
+            return rows % size, cols % size
+        inside = (rows >= 0) & (rows < size) & (cols >= 0) & (cols < size)
+        return rows[inside], cols[inside]
+
+    def reach_cells(self, cells, size):
+        #rows and columns of the cells in the windows of any of an (n, 2) array of cells, each once in row-major order
+        rows = cells[:, 0, np.newaxis] + self.reach[:, 0]
+        cols = cells[:, 1, np.newaxis] + self.reach[:, 1]
+        if self.boundary == 'torus':
+            rows, cols = rows % size, cols % size
+        else:
+            inside = (rows >= 0) & (rows < size) & (cols >= 0) & (cols < size)
+            rows, cols = rows[inside], cols[inside]
+        return np.divmod(np.unique(rows * size + cols), size)
+
+    def neighbour_cells(self, x, y, size):
+        rows, cols = self.window_cells(x, y, size)
+        others = (rows != x) | (cols != y)
+        return rows[others], cols[others]
+
+    def contains(self, dx, dy, size):
+        #whether each (dx, dy) offset is a neighbour, the cell itself is not
+        dx, dy = np.abs(dx), np.abs(dy)
+        if self.boundary == 'torus':
+            dx, dy = np.minimum(dx, size - dx), np.minimum(dy, size - dy)
+        within = np.maximum(dx, dy) <= self.radius if self.shape == 'moore' else dx + dy <= self.radius
+        return within & ((dx != 0) | (dy != 0))
@@ -0,0 +1,169 @@
+import os
+import sys
+from multiprocessing import Pool, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from .schelling_model import SchellingModel
+from .compiled import allocate_vacancies
+from .checkpoint import constructor_arguments
+from .tiled_model import strip_satisfaction
+from utils import ArrayCellSet, GRID_DTYPE
+
+
+def attach_shared_memory(name):
+    #workers only borrow the blocks, the model that created them unlinks them
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    #before 3.13 attaching registers the block with the resource tracker too, which would unlink it under the model
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class StripWorker:
+    #one process's view of the shared grid and move lists, with a small model for the satisfaction rule
+    def __init__(self, buffers, model_class, parameters):
+        self.grid, self.clears, self.writes, self.agents = buffers
+        radius = parameters.get('radius', 1)
+        self.model = model_class(grid_size=2 * radius + 1, **parameters)
+
+    def apply(self, task):
+        #the moves that touch this strip: its vacated cells are emptied first, then its destinations filled
+        (clear_start, clear_stop), (write_start, write_stop) = task
+        cells = self.grid.reshape(-1)
+        cells[self.clears[clear_start:clear_stop]] = self.model.empty
+        cells[self.writes[write_start:write_stop]] = self.agents[write_start:write_stop]
+
+    def dissatisfied(self, task):
+        #flat indices of the strip's dissatisfied agents in row-major order
+        start, stop, threshold = task
+        satisfaction = strip_satisfaction(self.model, self.grid, start, stop)
+        return np.flatnonzero(~(satisfaction >= threshold)) + start * self.grid.shape[1]
+
+
+worker = None #the StripWorker of a pool process
+
+
+def start_worker(names, shapes, model_class, parameters):
+    global worker
+    memory = [attach_shared_memory(name) for name in names]
+    buffers = [np.ndarray(shape, dtype, buffer=block.buf) for block, (shape, dtype) in zip(memory, shapes)]
+    worker = StripWorker(buffers, model_class, parameters)
+    worker.memory = memory #keeps the blocks mapped for the life of the process
+
+
+def run_worker(call):
+    method, task = call
+    return getattr(worker, method)(task)
+
+
+class ParallelSchellingModel:
+    #a SchellingModel (or SchellingIncomeModel) stepped by worker processes over row strips of a shared-memory grid
+    #each round has three phases: the workers find the dissatisfied agents of their strips, this process hands out the
+    #vacancies with the sequential round's draws and vacancy order, then the workers apply the moves landing in their
+    #strips; a strip only ever writes its own cells, so no phase needs locking
+    #the same seed gives exactly the grids of the in-memory model, whatever the number of processes
+    def __init__(self, processes=None, model_class=SchellingModel, seed=None, strips=None, **parameters):
+        if parameters.pop('relocation', 'random') != 'random' or parameters.pop('incremental', False):
+            raise ValueError("the parallel model only runs non-incremental random relocation")
+        if parameters.get('update_mode', 'sequential') != 'sequential':
+            raise ValueError("the parallel model only runs sequential updates")
+        self.model = model = model_class(seed=seed, **parameters)
+        self.processes = processes or os.cpu_count()
+        self.grid_size = model.grid_size
+        self.strip_rows = -(-self.grid_size // (strips or self.processes)) #rows per strip, rounded up
+        self.strip_starts = list(range(0, self.grid_size, self.strip_rows)) + [self.grid_size]
+        self.num_agents = int(np.count_nonzero(model.grid != model.empty))
+
+        #the grid and the round's move lists live in shared memory, the model's grid becomes a view of it
+        capacity = max(self.num_agents, 1)
+        shapes = [((self.grid_size, self.grid_size), GRID_DTYPE), ((capacity,), np.int64), ((capacity,), np.int64),
+                  ((capacity,), GRID_DTYPE)]
+        self.memory = [SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(dtype).itemsize)
+                       for shape, dtype in shapes]
+        buffers = [np.ndarray(shape, dtype, buffer=block.buf) for block, (shape, dtype) in zip(self.memory, shapes)]
+        buffers[0][:] = model.grid
+        model.grid = buffers[0]
+        model.grid_version += 1
+        self.grid, self.clears, self.writes, self.agents = buffers
+        model.empty_cells = ArrayCellSet(model.grid.shape, model.empty_cells.as_array()) #same order, in arrays
+
+        parameters = constructor_arguments(model, excluded=('grid_size', 'seed', 'relocation', 'incremental', 'backend'))
+        if self.processes == 1:
+            self.pool = None
+            self.local_worker = StripWorker(buffers, model_class, parameters)
+        else:
+            self.pool = Pool(self.processes, start_worker,
+                             ([block.name for block in self.memory], shapes, model_class, parameters))
+        self.update_dissatisfied_agents()
+
+    def map(self, method, tasks):
+        if self.pool is None:
+            return [getattr(self.local_worker, method)(task) for task in tasks]
+        return self.pool.map(run_worker, [(method, task) for task in tasks])
+
+    def strip_bounds(self, cells):
+        #where each strip's cells start and stop in cells, which must be sorted by strip
+        return np.searchsorted(cells // (self.strip_rows * self.grid_size), np.arange(len(self.strip_starts)))
+
+    def update_dissatisfied_agents(self):
+        tasks = [(start, stop, self.model.threshold) for start, stop in zip(self.strip_starts, self.strip_starts[1:])]
+        self.movers = np.concatenate(self.map('dissatisfied', tasks))
+
+    def step(self):
+        model = self.model
+        empty_cells = model.empty_cells
+        if len(self.movers) == 0 or len(empty_cells) == 0:
+            return False
+
+        #allocation: the pool size doesn't change during a round, so every mover takes one draw, as in compiled_step
+        movers = np.stack(np.divmod(self.movers, self.grid_size), axis=1)
+        draws = model.rng.random(len(movers))
+        destinations = np.zeros(movers.shape, dtype=np.int64)
+        allocate_vacancies(movers, draws, empty_cells.array, empty_cells.positions, len(empty_cells), destinations)
+
+        #apply: movers are already in row-major order, destinations are sorted into their strips
+        sources = self.movers
+        destinations = destinations[:, 0] * self.grid_size + destinations[:, 1]
+        order = np.argsort(destinations // (self.strip_rows * self.grid_size), kind='stable')
+        moves = len(sources)
+        self.agents[:moves] = self.grid.reshape(-1)[sources][order]
+        self.clears[:moves] = sources
+        self.writes[:moves] = destinations[order]
+        clear_bounds, write_bounds = self.strip_bounds(sources), self.strip_bounds(self.writes[:moves])
+        self.map('apply', [((clear_bounds[i], clear_bounds[i + 1]), (write_bounds[i], write_bounds[i + 1]))
+                           for i in range(len(self.strip_starts) - 1)])
+        model.grid_version += moves
+
+        self.update_dissatisfied_agents()
+        return True
+
+    def get_dissatisfied_agents(self):
+        return [tuple(cell) for cell in np.stack(np.divmod(self.movers, self.grid_size), axis=1).tolist()]
+
+    def calculate_satisfaction(self):
+        satisfied_agents = self.num_agents - len(self.movers)
+        return round((satisfied_agents / self.num_agents) * 100, 2) if self.num_agents > 0 else 100
+
+    def close(self):
+        #stops the workers and frees the shared memory, the model keeps a private copy of the grid
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self.local_worker = None
+        self.model.grid = np.array(self.grid)
+        self.grid = self.clears = self.writes = self.agents = None
+        for block in self.memory:
+            block.close()
+            block.unlink()
+        self.memory = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,93 @@
+import time
+import numpy as np
+
+
+class RelocationPolicy:
+    #picks where a dissatisfied agent moves to and keeps the cost of the current round
+    uses_neighbour_counts = False #policies that score vacancies need the model to keep its count planes
+
+    def __init__(self):
+        self.start_round()
+
+    def start_round(self, timed=False):
+        self.timed = timed #the clock is only read when the model keeps instrumentation, twice a move adds up
+        self.moves = 0
+        self.lookups = 0 #vacancy searches, one per dissatisfied agent
+        self.candidates_scored = 0
+        self.seconds = 0.0
+
+    def round_cost(self):
+        return {'moves': self.moves, 'lookups': self.lookups, 'candidates_scored': self.candidates_scored,
+                'seconds': self.seconds}
+
+    def relocate(self, model, source):
+        if self.timed:
+            start = time.perf_counter()
+            destination = self.choose(model, source)
+            self.seconds += time.perf_counter() - start
+        else:
+            destination = self.choose(model, source)
+        self.lookups += 1
+        if destination:
+            self.moves += 1
+        return destination
+
+    def choose(self, model, source):
+        raise NotImplementedError
+
+
+class RandomRelocation(RelocationPolicy):
+    #uniformly random empty cell, the original Schelling rule
+    def choose(self, model, source):
+        return model.find_empty_cell()
+
+
+class BestOfKRelocation(RelocationPolicy):
+    #samples k vacancies and moves to the one the agent would be most satisfied in
+    uses_neighbour_counts = True
+
+    def __init__(self, k=5):
+        self.k = k
+        super().__init__()
+
+    def choose(self, model, source):
+        num_empty = len(model.empty_cells)
+        if num_empty == 0:
+            return None
+        indices = model.rng.choice(num_empty, size=min(self.k, num_empty), replace=False)
+        sampled = [model.empty_cells[index] for index in indices]
+        scores = model.score_destinations(source, np.array(sampled))
+        self.candidates_scored += len(sampled)
+        return sampled[int(np.argmax(scores))]
+
+
+class NearestSatisfyingRelocation(RelocationPolicy):
+    #closest vacancy (euclidean) that would satisfy the agent, random vacancy if none would
+    uses_neighbour_counts = True
+
+    def choose(self, model, source):
+        if len(model.empty_cells) == 0:
+            return None
+        candidates = model.empty_cells.as_array()
+        scores = model.score_destinations(source, candidates)
+        self.candidates_scored += len(candidates)
+
+        satisfying = np.flatnonzero(scores >= model.threshold)
+        if len(satisfying) == 0:
+            return model.find_empty_cell()
+        distances = ((candidates[satisfying] - np.array(source)) ** 2).sum(axis=1)
+        return model.empty_cells[satisfying[int(np.argmin(distances))]]
+
+
+RELOCATION_POLICIES = {
+    'random': RandomRelocation,
+    'best_of_k': BestOfKRelocation,
+    'nearest_satisfying': NearestSatisfyingRelocation,
+}
+
+
+def make_relocation_policy(relocation):
+    #accepts a policy name or an already built policy
+    if isinstance(relocation, str):
+        return RELOCATION_POLICIES[relocation]()
+    return relocation
@@ -0,0 +1,91 @@
+import numpy as np
+from .schelling_model import SchellingModel
+
+
+class SchellingEnsemble:
+    #independent replicates of one model configuration stepped together as an (R, N, N) array
+    def __init__(self, replicates=100, model_class=SchellingModel, seed=None, **parameters):
+        if parameters.pop('relocation', 'random') != 'random' or parameters.pop('incremental', False):
+            raise ValueError("the ensemble only runs non-incremental random relocation")
+        if parameters.get('update_mode', 'sequential') != 'sequential':
+            raise ValueError("the ensemble only runs sequential updates")
+        #the template model supplies the parameters, the rng and the satisfaction rules, its own grid is unused
+        self.template = model_class(seed=seed, **parameters)
+        self.rng = self.template.rng
+        self.replicates = replicates
+        self.grid_size = self.template.grid_size
+        self.empty = self.template.empty
+
+        self.grids = np.stack([self.template.initialize_grid() for _ in range(replicates)])
+        self.rounds = np.zeros(replicates, dtype=int)
+        self.converged = np.zeros(replicates, dtype=bool)
+
+        #flat indices of each replicate's empty cells, every replicate has the same number of them
+        flat_grids = self.grids.reshape(replicates, -1)
+        self.empty_pool = np.nonzero(flat_grids == self.empty)[1].reshape(replicates, -1)
+        self.update_dissatisfied_agents()
+
+    @property
+    def threshold(self):
+        return self.template.threshold
+
+    def satisfaction_field(self):
+        #one batched neighbourhood count for every replicate at once
+        counts = self.template.count_neighbours(self.grids)
+        satisfaction = self.template.satisfaction_from_counts(self.grids, counts)
+        return satisfaction, ~(satisfaction >= self.threshold)
+
+    def update_dissatisfied_agents(self):
+        _, self.dissatisfied = self.satisfaction_field()
+
+    def mover_table(self):
+        #flat indices of each replicate's dissatisfied agents in row-major order, padded to the longest list
+        flat_dissatisfied = self.dissatisfied.reshape(self.replicates, -1)
+        num_movers = flat_dissatisfied.sum(axis=1)
+        replicate_index, cell_index = np.nonzero(flat_dissatisfied)
+        starts = np.concatenate([[0], np.cumsum(num_movers)[:-1]])
+        movers = np.zeros((self.replicates, num_movers.max(initial=0)), dtype=np.intp)
+        movers[replicate_index, np.arange(len(cell_index)) - starts[replicate_index]] = cell_index
+        return movers, num_movers
+
+    def step(self):
+        #same dynamics as SchellingModel.step for every replicate, returns which replicates moved
+        num_empty = self.empty_pool.shape[1]
+        movers, num_movers = self.mover_table()
+        if num_empty == 0: #nowhere to move to
+            num_movers[:] = 0
+            movers = movers[:, :0]
+
+        #the pool never changes size (a move takes one vacancy and frees another), so every draw is known up front
+        slots = self.rng.integers(max(num_empty, 1), size=movers.shape)
+        flat_grids = self.grids.reshape(self.replicates, -1)
+        for i in range(movers.shape[1]):
+            active = np.flatnonzero(num_movers > i)
+            sources = movers[active, i]
+            destinations = self.empty_pool[active, slots[active, i]]
+            flat_grids[active, destinations] = flat_grids[active, sources]
+            flat_grids[active, sources] = self.empty
+            self.empty_pool[active, slots[active, i]] = sources #the vacated cell takes the used vacancy's slot
+
+        moved = num_movers > 0
+        self.rounds += moved
+        self.converged = ~moved
+        if moved.any():
+            self.update_dissatisfied_agents()
+        return moved
+
+    def run(self, max_rounds=1000):
+        #steps until every replicate has converged or max_rounds is reached
+        for _ in range(max_rounds):
+            if not self.step().any():
+                break
+        return self.rounds
+
+    def calculate_satisfaction(self):
+        #percentage of satisfied agents per replicate, as SchellingModel.calculate_satisfaction
+        total_agents = np.count_nonzero(self.grids != self.empty, axis=(1, 2))
+        dissatisfied_agents = np.count_nonzero(self.dissatisfied, axis=(1, 2))
+        satisfaction = np.full(self.replicates, 100.0)
+        has_agents = total_agents > 0
+        satisfaction[has_agents] = np.round((total_agents - dissatisfied_agents)[has_agents] / total_agents[has_agents] * 100, 2)
+        return satisfaction
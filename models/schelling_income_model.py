@@ -1,45 +1,65 @@
 import numpy as np
-import random
 from .schelling_model import SchellingModel
+from functools import lru_cache
+from statistics import NormalDist
+from utils import encode_cells, decode_cells, MAX_INCOME_AGENT_TYPES
+
+
+@lru_cache(maxsize=None)
+def lognormal_sigma(gini_coefficient):
+    #the gini coefficient of a lognormal is 2 * phi(sigma / sqrt(2)) - 1, solved for sigma
+    return np.sqrt(2) * NormalDist().inv_cdf((gini_coefficient + 1) / 2)
+
+
+@lru_cache(maxsize=None)
+def income_group_shares(gini_coefficient):
+    #expected share of incomes below mean - sd, mean, mean + sd, mean + 2sd and above, from the lognormal cdf
+    sigma = lognormal_sigma(gini_coefficient)
+    mu = -(sigma ** 2) / 2 #mean income of 1, the shares are the same for any mean
+    std_dev = np.sqrt(np.exp(sigma ** 2) - 1)
+
+    cdf = [0.0]
+    for boundary in (1 - std_dev, 1, 1 + std_dev, 1 + 2 * std_dev):
+        cdf.append(NormalDist(mu, sigma).cdf(np.log(boundary)) if boundary > 0 else 0.0)
+    cdf.append(1.0)
+    return tuple(np.diff(cdf))
 
 
 class SchellingIncomeModel(SchellingModel):
-    def __init__(self, grid_size=50, threshold=0.3, empty_ratio=0.1, num_agent_types=2, mean_income=40000, gini_coefficient=0.34):
-        self.mean_income = mean_income
+    max_agent_types = MAX_INCOME_AGENT_TYPES #type * 10 + income group has to fit in a grid cell's code
+
+    def __init__(self, grid_size=50, threshold=0.3, empty_ratio=0.1, num_agent_types=2, mean_income=40000, gini_coefficient=0.34,
+                 incremental=False, relocation='random', seed=None, backend='python', radius=1, neighbourhood_shape='moore',
+                 boundary='clip', update_mode='sequential'):
+        self.mean_income = mean_income #shown in the gui, the income group shares are the same for any mean
         self.gini_coefficient = gini_coefficient
         self.income_groups = list(range(1, 6))
-        super().__init__(grid_size, threshold, empty_ratio, num_agent_types) #for some reason if I call the parent init before defining my new variables my code doesn't work?
+        super().__init__(grid_size, threshold, empty_ratio, num_agent_types, incremental, relocation, seed, backend,
+                         radius, neighbourhood_shape, boundary, update_mode) #for some reason if I call the parent init before defining my new variables my code doesn't work?
 
-    def initialize_grid(self):
+    def cell_runs(self):
         total_cells = self.grid_size ** 2
         num_empty = int(total_cells * self.empty_ratio)
         num_agents = total_cells - num_empty
 
         if num_agents == 0: #avoid calculating income distribution with 0 agents
-            return np.array([self.empty] * total_cells).reshape(self.grid_size, self.grid_size)
+            return [([self.empty], [num_empty])]
 
         #gets n. agents per income group
-        income_distribution = self.define_groups(self.mean_income, self.gini_coefficient, num_agents)
+        income_distribution = self.define_groups(self.gini_coefficient, num_agents)
 
-        agents = []
-        #loops through each income group, assigns agents systematically
-        for income_group, count in zip(self.income_groups, income_distribution):
-            #evenly distributes income groups across agent types
-            for agent_type in self.agent_types:
-                agents.extend([int(f"{agent_type}{income_group}")] * (count // len(self.agent_types)))
+        #assigns agents systematically, each income group evenly distributed across agent types
+        agent_types, income_groups = np.meshgrid(self.agent_types, self.income_groups)
+        per_type = np.repeat(np.array(income_distribution) // len(self.agent_types), len(self.agent_types))
 
         #adjusts for leftover agents
-        remaining_agents = num_agents - len(agents)
-        if remaining_agents > 0:
-            for i in range(remaining_agents):
-                income_group = self.income_groups[i % len(self.income_groups)]
-                agent_type = self.agent_types[i % len(self.agent_types)]
-                agents.append(int(f"{agent_type}{income_group}"))
+        remaining = np.arange(num_agents - per_type.sum())
+        leftover = encode_cells(np.array(self.agent_types)[remaining % len(self.agent_types)],
+                                np.array(self.income_groups)[remaining % len(self.income_groups)])
 
-        cells = agents + [self.empty] * num_empty
-
-        random.shuffle(cells)
-        return np.array(cells).reshape(self.grid_size, self.grid_size)
+        return [(encode_cells(agent_types, income_groups).ravel(), per_type),
+                (leftover, np.ones(len(leftover), dtype=np.int64)),
+                ([self.empty], [num_empty])]
 
     def is_satisfied(self, x, y):
         agent = self.grid[x, y]
@@ -50,9 +70,7 @@ class SchellingIncomeModel(SchellingModel):
         agent_type = agent // 10
         agent_income_group = agent % 10
 
-        neighbours = [(x - 1, y - 1), (x - 1, y), (x - 1, y + 1),
-                      (x, y - 1),                 (x, y + 1),
-                      (x + 1, y - 1), (x + 1, y), (x + 1, y + 1)]
+        neighbours = self.neighbourhood.neighbour_list(x, y, self.grid_size)
 
 
         total_neighbours = 0
@@ -76,75 +94,50 @@ class SchellingIncomeModel(SchellingModel):
         satisfaction = (income_group_comparison + same_agent_type) / (2 * total_neighbours)
         return satisfaction 
 
-    def calculate_mu(self, sigma, mean_income): #for log distribution graph
-        return np.log(self.mean_income) - (sigma ** 2) / 2
-
-    #compares generated GC against user input GC
-    def calculate_gini(self, array):
-        array = np.sort(array)
-        index = np.arange(1, array.shape[0] + 1)
-        n = array.shape[0]
-        return ((np.sum((2 * index - n - 1) * array)) / (n * np.sum(array)))
-
-    def group_by_sigma(self, incomes):
-        std_dev = np.std(incomes)
-        negative_sigma = self.mean_income - std_dev
-        positive_sigma = self.mean_income + std_dev
-        positive_sigma2 = self.mean_income + 2 * std_dev
-
-        negative_sigma_index = np.searchsorted(incomes, negative_sigma)
-        mean_income_index = np.searchsorted(incomes, self.mean_income)
-        positive_sigma_index = np.searchsorted(incomes, positive_sigma)
-        positive_sigma2_index = np.searchsorted(incomes, positive_sigma2)
-
-        groups = [
-            int(negative_sigma_index),
-            int(mean_income_index - negative_sigma_index),
-            int(positive_sigma_index - mean_income_index),
-            int(positive_sigma2_index - positive_sigma_index),
-            int(len(incomes) - positive_sigma2_index)
-        ]
-
-        return groups
-
-    def define_groups(self, mean_income, gini_coefficient, num_agents):
+    def decode_grid(self, grid):
+        #separates the two attributes of every cell into type and income planes, empty cells get 0 in both
+        return decode_cells(grid, True)
+
+    def layer_masks(self, grid):
+        #layer 0 marks occupied cells, then one layer per agent type, then one per income group
+        occupied, agent_types, income_groups = self.decode_grid(grid)
+        return np.stack([occupied]
+                        + [agent_types == agent_type for agent_type in self.agent_types]
+                        + [income_groups == income_group for income_group in self.income_groups])
+
+    def satisfaction_from_counts(self, grid, counts):
+        occupied, agent_types, income_groups = self.decode_grid(grid)
+        type_counts = counts[:self.num_agent_types + 1]
+        income_counts = counts[self.num_agent_types + 1:]
+
+        total_neighbours = counts[0]
+        same_agent_type = np.take_along_axis(type_counts, agent_types[np.newaxis], axis=0)[0]
+
+        #weights are multiples of 0.25 so the sum is exact, same as adding them one neighbour at a time
+        income_group_comparison = np.zeros(grid.shape)
+        for income_group, income_count in zip(self.income_groups, income_counts):
+            income_group_comparison += income_count * (1 - (np.abs(income_group - income_groups) / 4))
+
+        satisfaction = np.ones(grid.shape)
+        has_neighbours = occupied & (total_neighbours > 0)
+        #counts are widened before doubling, twice a neighbourhood of over 63 cells overflows int8
+        satisfaction[has_neighbours] = ((income_group_comparison[has_neighbours] + same_agent_type[has_neighbours])
+                                        / (2 * total_neighbours[has_neighbours].astype(np.int64)))
+        return satisfaction
+
+    def define_groups(self, gini_coefficient, num_agents):
         if gini_coefficient < 0.03: #perfect equality
             return [num_agents, 0, 0, 0, 0]
 
         if gini_coefficient > 0.97: #perfect inequality
             return [num_agents - 1, 0, 0, 0, 1]
 
-        #determine sigma range based on gini coefficient
-        if gini_coefficient < 0.3:
-            left, right = 0.1, 1.0
-        elif gini_coefficient > 0.7:
-            left, right = 0.5, 3.0  
-        else:
-            left, right = 0.1, 2.0 
-
-        #binary search to adjust sigma
-        tolerance = 0.01
-        best_sigma = (left + right) / 2
-
-        iteration = 0
-        max_iterations = 100
-        while right - left > tolerance and iteration < max_iterations:          
-            sigma = (left + right) / 2
-            mu = self.calculate_mu(sigma, self.mean_income)  
-            incomes = np.random.lognormal(mean=mu, sigma=sigma, size=num_agents)
-            calculated_gini = self.calculate_gini(incomes)
-
-            if abs(calculated_gini - self.gini_coefficient) < tolerance:
-                best_sigma = sigma
-                break
-            elif calculated_gini > self.gini_coefficient:
-                right = sigma 
-            else:
-                left = sigma 
-
-        #final distribution with best sigma
-        mu = self.calculate_mu(best_sigma, self.mean_income)
-        incomes = np.random.lognormal(mean=mu, sigma=best_sigma, size=num_agents)
-        sorted_incomes = np.sort(incomes)
-
-        return self.group_by_sigma(sorted_incomes)
+        #the group shares of a lognormal don't depend on the mean income, only on sigma
+        shares = np.array(income_group_shares(round(gini_coefficient, 6)))
+
+        #largest remainder rounding, so the counts add up to num_agents and ties always go the same way
+        exact_counts = shares * num_agents
+        groups = np.floor(exact_counts).astype(int)
+        leftover = num_agents - groups.sum()
+        groups[np.argsort(-(exact_counts - groups), kind='stable')[:leftover]] += 1
+        return [int(count) for count in groups]
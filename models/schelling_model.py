@@ -1,19 +1,77 @@
+import time
 import numpy as np
-import random
+from .neighbourhood import Neighbourhood
+from .relocation import make_relocation_policy, RandomRelocation
+from .compiled import resolve_backend, relocate_random, layer_table
+from .trajectory import apply_moves
+from utils import CellSet, ArrayCellSet, GRID_DTYPE, MAX_AGENT_TYPES
+
+
+UPDATE_MODES = ('sequential', 'synchronous')
+RESCAN_SHARE = 0.25 #incremental rounds rescan the whole grid once the windows they touched cover this share of it
 
 
 class SchellingModel:
-    def __init__(self, grid_size=50, threshold=0.3, empty_ratio=0.1, num_agent_types=2): #default initial grid
+    max_agent_types = MAX_AGENT_TYPES #as many as a grid cell's code can hold
+
+    def __init__(self, grid_size=50, threshold=0.3, empty_ratio=0.1, num_agent_types=2, incremental=False,
+                 relocation='random', seed=None, backend='python', radius=1, neighbourhood_shape='moore',
+                 boundary='clip', update_mode='sequential'): #default initial grid
         self.grid_size = grid_size
         self.threshold = threshold
         self.empty_ratio = empty_ratio
         self.empty = -1
+        if num_agent_types > self.max_agent_types:
+            raise ValueError(f"{type(self).__name__} supports at most {self.max_agent_types} agent types, "
+                             f"got {num_agent_types}")
         self.agent_types = list(range(1, num_agent_types + 1))
         self.num_agent_types = num_agent_types
+        self.rng = np.random.default_rng(seed) #int, SeedSequence or Generator, all randomness goes through it
+        self.incremental = incremental #updates only the cells around each round's moves instead of rescanning the grid
+        self.radius = radius
+        self.neighbourhood_shape = neighbourhood_shape #'moore' (square) or 'von_neumann' (diamond)
+        self.boundary = boundary #'clip' stops at the grid edge, 'torus' wraps around it
+        self.neighbourhood = Neighbourhood(radius, neighbourhood_shape, boundary)
+        self.neighbourhood.check_grid(grid_size)
+        self.relocation = make_relocation_policy(relocation) #where dissatisfied agents move to
+        #'sequential': dissatisfied agents move one at a time, each seeing the moves before it (the original dynamics)
+        #'synchronous': a different dynamics, every dissatisfied agent leaves at once and they are dealt a random
+        #permutation of the vacancies plus the cells they left, so an agent can land back where it was or in another
+        #mover's cell, and movers can swap places even when there are no vacancies
+        if update_mode not in UPDATE_MODES:
+            raise ValueError(f"unknown update mode {update_mode!r}, expected one of {UPDATE_MODES}")
+        if update_mode == 'synchronous' and type(self.relocation) is not RandomRelocation:
+            raise ValueError("synchronous updates only support random relocation")
+        self.update_mode = update_mode
+        self.neighbour_counts = None
+        self.layer_cache = {}
+        self.measure_tracker = None #optional MeasureTracker updated after every round
+        self.instrumentation = None #optional Instrumentation, records phase timings and counts once per round
+        self.trajectory_recorder = None #optional TrajectoryRecorder, keeps every move for replay
+        self.convergence_detector = None #optional ConvergenceDetector, ends runs that plateau or cycle
+        self.termination_reason = None #why step() last returned False: 'converged', 'plateau' or 'cycle'
+        self.backend = resolve_backend(backend) #'numba' runs random relocation rounds as one compiled loop
+        self.compiled_layers = None
+        self.empty_cells = CellSet()
+        self.grid_version = 0 #bumped whenever the grid changes, caches compare against it
+        self.satisfaction_cache = (None, None)
+        self.satisfaction_percentage_cache = (None, None)
         self.grid = self.initialize_grid()
-        self.dissatisfied_agents = self.get_dissatisfied_agents()
+        self.update_dissatisfied_agents()
 
     def initialize_grid(self):
+        #1D array of grid, one signed byte per cell
+        cells = np.concatenate([np.repeat(np.asarray(values, dtype=GRID_DTYPE), counts) for values, counts in self.cell_runs()])
+
+        #shuffles cells and makes the grid 2D, a grid with no agents is the same in any order
+        if np.any(cells != self.empty):
+            cells = self.rng.permutation(cells)
+        grid = cells.reshape(self.grid_size, self.grid_size)
+        self.seed_empty_cells(grid)
+        return grid
+
+    def cell_runs(self):
+        #unshuffled cells as (values, counts) runs, so the tiled engine can write them without building the array
         #calculate amount of agents
         total_cells = self.grid_size ** 2
         num_empty = int(total_cells * self.empty_ratio)
@@ -23,24 +81,24 @@ class SchellingModel:
         num_per_type = num_agents // self.num_agent_types
         remaining_agents = num_agents % self.num_agent_types
 
-        #1D array of grid
-        cells = [self.empty] * num_empty
-        for agent_type in self.agent_types:
-            cells.extend([agent_type] * num_per_type)
-        cells.extend([random.choice(self.agent_types) for i in range(remaining_agents)])
+        remaining = self.rng.choice(self.agent_types, remaining_agents)
+        return [([self.empty], [num_empty]),
+                (self.agent_types, [num_per_type] * self.num_agent_types),
+                (remaining, np.ones(len(remaining), dtype=np.int64))]
 
-        #shuffles cells and makes the grid 2D
-        random.shuffle(cells)
-        return np.array(cells).reshape(self.grid_size, self.grid_size)
+    def seed_empty_cells(self, grid):
+        #index of empty cells so find_empty_cell doesn't have to scan the grid
+        if self.backend == 'numba': #same order and operations, kept in arrays the compiled round can update
+            self.empty_cells = ArrayCellSet(grid.shape, np.argwhere(grid == self.empty))
+        else:
+            self.empty_cells = CellSet(tuple(cell) for cell in np.argwhere(grid == self.empty).tolist())
 
     def is_satisfied(self, x, y):
         agent = self.grid[x, y]
         if agent == self.empty:
             return True #empty cells always satisfied
 
-        neighbours = [(x - 1, y - 1), (x - 1, y), (x - 1, y + 1),
-                      (x, y - 1),                 (x, y + 1),
-                      (x + 1, y - 1), (x + 1, y), (x + 1, y + 1)]
+        neighbours = self.neighbourhood.neighbour_list(x, y, self.grid_size) #the 8 surrounding cells by default
 
         same_agent_type = 0
         total_neighbours = 0
@@ -58,32 +116,321 @@ class SchellingModel:
         satisfaction = same_agent_type / total_neighbours
         return satisfaction 
 
+    def layer_masks(self, grid):
+        #one boolean layer per counted attribute: layer 0 marks occupied cells, layer t marks agents of type t
+        return np.stack([grid != self.empty] + [grid == agent_type for agent_type in self.agent_types])
+
+    def count_neighbours(self, grid):
+        #neighbour counts of every layer for every cell, int8 unless the neighbourhood has over 127 cells
+        return self.neighbourhood.sum(self.layer_masks(grid).astype(self.neighbourhood.count_dtype))
+
+    def satisfaction_from_counts(self, grid, counts):
+        #whole-array version of is_satisfied, empty cells and cells with no neighbours are fully satisfied
+        occupied = grid != self.empty
+        total_neighbours = counts[0]
+        agent_types = np.where(occupied, grid, 0)
+        same_agent_type = np.take_along_axis(counts, agent_types[np.newaxis], axis=0)[0]
+
+        satisfaction = np.ones(grid.shape)
+        has_neighbours = occupied & (total_neighbours > 0)
+        satisfaction[has_neighbours] = same_agent_type[has_neighbours] / total_neighbours[has_neighbours]
+        return satisfaction
+
+    def cell_neighbour_counts(self, rows, cols):
+        #neighbour counts of the given cells only, read from the count planes or, when the model keeps none, the grid
+        if self.neighbour_counts is not None:
+            return self.neighbour_counts[:, rows, cols]
+        neighbour_rows = rows[:, np.newaxis] + self.neighbourhood.offset_array[:, 0]
+        neighbour_cols = cols[:, np.newaxis] + self.neighbourhood.offset_array[:, 1]
+        if self.boundary == 'torus':
+            neighbours = self.grid[neighbour_rows % self.grid_size, neighbour_cols % self.grid_size]
+        else:
+            inside = ((neighbour_rows >= 0) & (neighbour_rows < self.grid_size)
+                      & (neighbour_cols >= 0) & (neighbour_cols < self.grid_size))
+            neighbours = np.where(inside, self.grid[np.clip(neighbour_rows, 0, self.grid_size - 1),
+                                                    np.clip(neighbour_cols, 0, self.grid_size - 1)], self.empty)
+        return self.layer_masks(neighbours).sum(axis=-1, dtype=self.neighbourhood.count_dtype)
+
+    def satisfaction_ratios(self):
+        #satisfaction ratio of every cell, computed once per grid version (don't modify the returned array)
+        version, satisfaction = self.satisfaction_cache
+        if version != self.grid_version:
+            counts = self.neighbour_counts if self.neighbour_counts is not None else self.count_neighbours(self.grid)
+            satisfaction = self.satisfaction_from_counts(self.grid, counts)
+            self.satisfaction_cache = (self.grid_version, satisfaction)
+        return satisfaction
+
+    def satisfaction_field(self):
+        #satisfaction ratio of every cell and the mask of dissatisfied agents in one pass
+        satisfaction = self.satisfaction_ratios()
+        dissatisfied = ~(satisfaction >= self.threshold)
+        return satisfaction, dissatisfied
+
     def get_dissatisfied_agents(self):
-        dissatisfied_agents = []
-        #iterates through every agent
-        for x in range(self.grid_size):
-            for y in range(self.grid_size):
-                if not (self.is_satisfied(x, y) >= self.threshold):
-                    dissatisfied_agents.append((x, y))
-        return dissatisfied_agents
+        _, dissatisfied = self.satisfaction_field()
+        return [tuple(cell) for cell in np.argwhere(dissatisfied).tolist()] #row-major order, same as a full scan
+
+    def needs_neighbour_counts(self):
+        return self.incremental or self.relocation.uses_neighbour_counts
+
+    def reset(self):
+        #new random grid with the current parameters
+        self.neighbourhood.check_grid(self.grid_size)
+        self.grid = self.initialize_grid()
+        self.update_dissatisfied_agents()
+        if self.measure_tracker is not None:
+            self.measure_tracker.reset()
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.reset()
+        if self.convergence_detector is not None:
+            self.convergence_detector.reset()
+        self.termination_reason = None
+
+    def update_dissatisfied_agents(self):
+        #full rebuild, needed after the grid is replaced or the threshold changes
+        self.grid_version += 1
+        if self.needs_neighbour_counts():
+            self.neighbour_counts = self.count_neighbours(self.grid)
+        else:
+            self.neighbour_counts = None
+        if not self.incremental:
+            self.dissatisfied_agents = self.get_dissatisfied_agents()
+            return
+        _, dissatisfied = self.satisfaction_field()
+        self.dissatisfied_agents = CellSet(tuple(cell) for cell in np.argwhere(dissatisfied).tolist())
+
+    def neighbourhood_window(self, x, y):
+        #index of a cell and its neighbours, slices of the block around it for the default neighbourhood
+        return self.neighbourhood.window(x, y, self.grid_size)
+
+    def agent_layers(self, agent):
+        #indices of the count layers an agent value counts towards
+        agent = int(agent)
+        if agent not in self.layer_cache:
+            self.layer_cache[agent] = np.flatnonzero(self.layer_masks(np.array([[agent]]))[:, 0, 0])
+        return self.layer_cache[agent]
+
+    def update_neighbour_counts(self, x, y, agent, change):
+        #adds change to every layer the agent counts towards, for all of its neighbours
+        layers = self.agent_layers(agent)
+        rows, cols = self.neighbourhood_window(x, y)
+        if isinstance(rows, slice):
+            self.neighbour_counts[layers, rows, cols] += change
+        else:
+            self.neighbour_counts[layers[:, np.newaxis], rows, cols] += change
+        self.neighbour_counts[layers, x, y] -= change #a cell is not its own neighbour
+
+    def defers_neighbour_counts(self):
+        #nothing reads the counts during a random relocation round, so they are updated at its end
+        return self.neighbour_counts is not None and not self.relocation.uses_neighbour_counts
+
+    def apply_count_changes(self, moves):
+        #count updates held back during a round, a recount once their windows would cover a large share of the grid
+        if 2 * len(moves) * len(self.neighbourhood.reach) >= RESCAN_SHARE * self.grid.size:
+            self.neighbour_counts = self.count_neighbours(self.grid)
+            return
+        for source, destination, agent in moves:
+            self.update_neighbour_counts(*source, agent, -1)
+            self.update_neighbour_counts(*destination, agent, 1)
+
+    def refresh_dissatisfied(self, cells):
+        #re-evaluates the cells whose neighbour counts changed in a round, in one batch at its end since movers are
+        #picked at the start of the round, or every cell once the windows would cover a large share of the grid
+        if len(cells) * len(self.neighbourhood.reach) >= RESCAN_SHARE * self.grid.size:
+            _, dissatisfied = self.satisfaction_field()
+            self.dissatisfied_agents = CellSet(tuple(cell) for cell in np.argwhere(dissatisfied).tolist())
+            return
+        rows, cols = self.neighbourhood.reach_cells(cells, self.grid_size)
+        satisfaction = self.satisfaction_from_counts(self.grid[rows, cols], self.neighbour_counts[:, rows, cols])
+        dissatisfied = ~(satisfaction >= self.threshold)
+        for cell, is_dissatisfied in zip(zip(rows.tolist(), cols.tolist()), dissatisfied.tolist()):
+            if is_dissatisfied:
+                self.dissatisfied_agents.add(cell)
+            else:
+                self.dissatisfied_agents.discard(cell)
+
+    def move_agent(self, source, destination, update_counts=True):
+        x, y = source
+        ex, ey = destination
+        agent = self.grid[x, y]
+        self.grid_version += 1
+        self.grid[ex, ey], self.grid[x, y] = agent, self.empty #swaps positions
+        self.empty_cells.discard(destination)
+        self.empty_cells.add(source)
+        if self.neighbour_counts is not None and update_counts:
+            self.update_neighbour_counts(x, y, agent, -1)
+            self.update_neighbour_counts(ex, ey, agent, 1)
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.record_move(source, destination)
 
     def find_empty_cell(self):
-        empty_cells = np.argwhere(self.grid == self.empty) 
-        return tuple(empty_cells[random.randint(0, len(empty_cells) - 1)]) if len(empty_cells) > 0 else None
+        return self.empty_cells.choice(self.rng) if len(self.empty_cells) > 0 else None
+
+    def score_destinations(self, source, candidates):
+        #satisfaction the agent at source would have at each candidate cell, scored in one batch from the count planes
+        x, y = source
+        agent = self.grid[x, y]
+        rows, cols = candidates[:, 0], candidates[:, 1]
+        counts = self.neighbour_counts[:, rows, cols]
+
+        #the agent would no longer be its own neighbour after moving
+        adjacent = np.flatnonzero(self.neighbourhood.contains(rows - x, cols - y, self.grid_size))
+        counts[np.ix_(self.agent_layers(agent), adjacent)] -= 1
+        return self.satisfaction_from_counts(np.full(len(candidates), agent), counts)
+
+    def compiled_step(self):
+        #the sequential round as one compiled loop, moves and random draws are exactly the python path's
+        self.relocation.start_round()
+        start = time.perf_counter()
+        movers = sorted(self.dissatisfied_agents) if self.incremental else self.dissatisfied_agents
+        movers = np.array(movers, dtype=np.int64).reshape(-1, 2)
+        #the pool size doesn't change during a round, so every mover takes exactly one draw while it's non-empty
+        draws = self.rng.random(len(movers)) if len(self.empty_cells) > 0 else np.zeros(0)
+        if self.compiled_layers is None:
+            self.compiled_layers = layer_table(self)
+        track_counts = self.neighbour_counts is not None
+        counts = self.neighbour_counts if track_counts else np.zeros((1, 1, 1), dtype=np.int8)
+        destinations = np.zeros(movers.shape, dtype=np.int64)
+        moves = relocate_random(self.grid, movers, draws, self.empty_cells.array, self.empty_cells.positions,
+                                len(self.empty_cells), self.empty, counts, self.compiled_layers, track_counts,
+                                self.neighbourhood.offset_array, self.boundary == 'torus', destinations)
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.record_moves(movers[:moves], destinations[:moves])
+        self.relocation.moves = moves
+        self.grid_version += moves
+        self.relocation.lookups = len(draws)
+        self.relocation.seconds = time.perf_counter() - start
+        if self.instrumentation is not None:
+            self.instrumentation.mark('move')
+
+        if moves and self.incremental:
+            self.refresh_dissatisfied(np.vstack([movers[:moves], destinations[:moves]])) #the counts are up to date
+        elif moves:
+            self.dissatisfied_agents = self.get_dissatisfied_agents()
+        if moves and self.measure_tracker is not None:
+            if self.instrumentation is not None:
+                self.instrumentation.mark('rescan')
+            self.measure_tracker.record_moves(movers[:moves], destinations[:moves])
+            self.measure_tracker.record_round()
+        return moves > 0
 
     def step(self):
-        moved = False
-        for x, y in self.dissatisfied_agents:
-            empty_cell = self.find_empty_cell()
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.start_round()
+            dissatisfied = len(self.dissatisfied_agents)
+        if self.update_mode == 'synchronous':
+            moved = self.synchronous_step()
+        elif self.backend == 'numba' and type(self.relocation) is RandomRelocation:
+            moved = self.compiled_step()
+        else:
+            moved = self.python_step()
+        if moved and self.trajectory_recorder is not None:
+            self.trajectory_recorder.end_round()
+        if instrumentation is not None:
+            self.record_instrumentation(instrumentation, dissatisfied)
+        if not moved:
+            self.termination_reason = 'converged' #no agent could move
+        elif self.convergence_detector is not None:
+            self.termination_reason = self.convergence_detector.update()
+        else:
+            self.termination_reason = None
+        return self.termination_reason is None
+
+    def python_step(self):
+        moves = []
+        self.relocation.start_round(timed=self.instrumentation is not None)
+        deferred = self.defers_neighbour_counts()
+        #agents dissatisfied at the start of the round move in row-major order in both modes
+        movers = sorted(self.dissatisfied_agents) if self.incremental else self.dissatisfied_agents
+        for x, y in movers:
+            empty_cell = self.relocation.relocate(self, (x, y))
             if empty_cell:
-                ex, ey = empty_cell
-                self.grid[ex, ey], self.grid[x, y] = self.grid[x, y], self.empty #swaps positions
-                moved = True
+                moves.append(((x, y), empty_cell, self.grid[x, y]))
+                self.move_agent((x, y), empty_cell, update_counts=not deferred)
+        moved = len(moves) > 0
+        if self.instrumentation is not None:
+            self.instrumentation.mark('move')
         if moved:
+            cells = np.array([move[:2] for move in moves], dtype=np.int64) #source and destination of every move
+        if moved and deferred:
+            self.apply_count_changes(moves)
+        if moved and self.incremental:
+            self.refresh_dissatisfied(cells.reshape(-1, 2))
+        elif moved:
             self.dissatisfied_agents = self.get_dissatisfied_agents() 
+        if self.instrumentation is not None:
+            self.instrumentation.mark('rescan')
+        if moved and self.measure_tracker is not None:
+            self.measure_tracker.record_moves(cells[:, 0], cells[:, 1])
+            self.measure_tracker.record_round()
         return moved
 
+    def synchronous_step(self):
+        #every dissatisfied agent moves at once, dealt a random permutation of the vacancies and the cells they leave
+        self.relocation.start_round()
+        start = time.perf_counter()
+        movers = sorted(self.dissatisfied_agents) if self.incremental else self.dissatisfied_agents
+        sources = np.array(movers, dtype=np.int64).reshape(-1, 2)
+        if len(sources) == 0:
+            return False
+
+        #picks index the vacancies, then the movers' own cells, a random ordered sample is a permutation's first cells
+        num_empty = len(self.empty_cells)
+        picks = self.rng.choice(num_empty + len(sources), size=len(sources), replace=False)
+        from_pool = picks < num_empty
+        destinations = np.empty_like(sources)
+        destinations[~from_pool] = sources[picks[~from_pool] - num_empty]
+        taken = [self.empty_cells[index] for index in picks[from_pool].tolist()]
+        destinations[from_pool] = np.array(taken, dtype=np.int64).reshape(-1, 2)
+
+        #vacancies taken leave the pool in pick order, then the cells nobody was dealt join it in row-major order
+        dealt = np.zeros(len(sources), dtype=bool)
+        dealt[picks[~from_pool] - num_empty] = True
+        for cell in taken:
+            self.empty_cells.discard(cell)
+        for cell in sources[~dealt].tolist():
+            self.empty_cells.add(tuple(cell))
+
+        moved = np.any(destinations != sources, axis=1) #agents dealt their own cell stay put
+        moves = int(np.count_nonzero(moved))
+        moves_array = np.hstack([sources[moved], destinations[moved]])
+        apply_moves(self.grid, moves_array, self.empty) #empties every source first, then fills the destinations
+        self.relocation.moves = moves
+        self.relocation.lookups = len(sources)
+        self.relocation.seconds = time.perf_counter() - start
+        if self.instrumentation is not None:
+            self.instrumentation.mark('move')
+        if moves:
+            if self.trajectory_recorder is not None:
+                self.trajectory_recorder.record_moves(moves_array[:, :2], moves_array[:, 2:])
+            self.update_dissatisfied_agents() #a batch touches too many windows for per-move count updates to pay off
+            if self.measure_tracker is not None:
+                self.measure_tracker.record_moves(moves_array[:, :2], moves_array[:, 2:])
+        elif num_empty + len(sources) == 1:
+            return False #a lone mover and no vacancies, there was nowhere else to go
+        if self.measure_tracker is not None:
+            self.measure_tracker.record_round()
+        return True #a deal that hands every mover its own cell is still a round, the next deal can differ
+
+    def record_instrumentation(self, instrumentation, dissatisfied):
+        instrumentation.mark('rescan' if self.measure_tracker is None else 'measure_tracker')
+        cost = self.relocation.round_cost()
+        #relocation time is part of the move loop, split out so the phases add up to the round
+        instrumentation.phases['move'] = instrumentation.phases.get('move', 0.0) - cost['seconds']
+        instrumentation.phases['relocate'] = cost['seconds']
+        instrumentation.end_round(moves=cost['moves'], dissatisfied=dissatisfied, vacancy_lookups=cost['lookups'],
+                                  candidates_scored=cost['candidates_scored'],
+                                  round_seconds=sum(instrumentation.phases.values()))
+
     def calculate_satisfaction(self):
+        #called every GUI frame, only recounted when the grid or threshold has changed
+        key = (self.grid_version, self.threshold)
+        cached_key, percentage = self.satisfaction_percentage_cache
+        if cached_key == key:
+            return percentage
         total_agents = np.count_nonzero(self.grid != self.empty)
         satisfied_agents = total_agents - len(self.dissatisfied_agents)
-        return round((satisfied_agents / total_agents) * 100, 2) if total_agents > 0 else 100
+        percentage = round((satisfied_agents / total_agents) * 100, 2) if total_agents > 0 else 100
+        self.satisfaction_percentage_cache = (key, percentage)
+        return percentage
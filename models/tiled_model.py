@@ -0,0 +1,165 @@
+import os
+import numpy as np
+from .schelling_model import SchellingModel
+from .compiled import resolve_backend, backend_kernel, relocate_random
+from utils import GRID_DTYPE
+
+
+def read_strip(grid, neighbourhood, start, stop):
+    #rows start to stop with the halo rows above and below, and where row start is in them
+    #on a torus the halo wraps, the wrap the neighbourhood sum adds only touches the halo rows
+    grid_size = grid.shape[0]
+    radius = neighbourhood.radius
+    if neighbourhood.boundary == 'torus':
+        return np.array(grid[np.arange(start - radius, stop + radius) % grid_size]), radius
+    first, last = max(start - radius, 0), min(stop + radius, grid_size)
+    return np.array(grid[first:last]), start - first
+
+
+def strip_satisfaction(model, grid, start, stop):
+    #satisfaction ratios of rows start to stop of grid, as model.satisfaction_ratios gives them for the whole grid
+    halo, top = read_strip(grid, model.neighbourhood, start, stop)
+    counts = model.count_neighbours(halo)
+    rows = slice(top, top + stop - start)
+    return model.satisfaction_from_counts(halo[rows], counts[:, rows])
+
+
+class TiledSchellingModel:
+    #a SchellingModel whose grid lives in a memory-mapped file in directory, for grids too big for memory
+    #satisfaction is worked out a strip of tile_rows rows at a time, plus the halo of rows the strip's neighbourhoods
+    #reach into, so memory use depends on the strip size and not the grid size
+    #runs non-incremental random relocation: the same seed gives exactly the grids of the in-memory model
+    def __init__(self, directory, grid_size=50, tile_rows=256, model_class=SchellingModel, seed=None,
+                 chunk_size=65536, backend='python', **parameters):
+        if parameters.pop('relocation', 'random') != 'random' or parameters.pop('incremental', False):
+            raise ValueError("the tiled model only runs non-incremental random relocation")
+        if parameters.get('update_mode', 'sequential') != 'sequential':
+            raise ValueError("the tiled model only runs sequential updates")
+        #a model on the smallest grid its neighbourhood allows supplies the layer masks, satisfaction rule and cells
+        radius = parameters.get('radius', 1)
+        self.template = model_class(grid_size=2 * radius + 1, **parameters)
+        self.template.grid_size = grid_size
+        self.rng = np.random.default_rng(seed)
+        self.template.rng = self.rng #the template draws the leftover agents from the model's stream
+
+        self.directory = directory
+        self.grid_size = grid_size
+        self.tile_rows = tile_rows
+        self.chunk_size = chunk_size #movers handed to the relocation loop at a time
+        self.backend = resolve_backend(backend) #'numba' runs each chunk through the compiled relocation loop
+        self.relocate_random = backend_kernel(relocate_random, self.backend)
+        self.threshold = self.template.threshold
+        self.empty_ratio = self.template.empty_ratio
+        self.num_agent_types = self.template.num_agent_types
+        self.empty = self.template.empty
+        self.neighbourhood = self.template.neighbourhood
+        self.neighbourhood.check_grid(grid_size)
+        self.grid_version = 0
+        self.satisfaction_total = (None, None) #(grid version, sum of the satisfaction field)
+
+        os.makedirs(directory, exist_ok=True)
+        self.grid = self.open_array('grid', (grid_size, grid_size), GRID_DTYPE)
+        self.reset()
+
+    def open_array(self, name, shape, dtype):
+        #.npy files, so a saved grid can be opened again with np.load(path, mmap_mode='r')
+        return np.lib.format.open_memmap(os.path.join(self.directory, f'{name}.npy'), mode='w+', dtype=dtype,
+                                         shape=shape)
+
+    def strips(self):
+        for start in range(0, self.grid_size, self.tile_rows):
+            yield start, min(start + self.tile_rows, self.grid_size)
+
+    def reset(self):
+        self.initialize_grid()
+        self.update_dissatisfied_agents()
+
+    def initialize_grid(self):
+        #the in-memory model's cells and shuffle, written straight into the file
+        cells = np.asarray(self.grid).reshape(-1) #plain ndarray view of the file, rng.shuffle is slow on subclasses
+        position = 0
+        for values, counts in self.template.cell_runs():
+            for value, count in zip(np.asarray(values, dtype=GRID_DTYPE).tolist(), np.asarray(counts).tolist()):
+                cells[position:position + count] = value
+                position += count
+        self.num_agents = self.grid_size ** 2 - int(self.grid_size ** 2 * self.empty_ratio)
+        if self.num_agents > 0:
+            self.rng.shuffle(cells) #in place, the same order rng.permutation gives
+        self.grid.flush()
+        self.seed_empty_cells()
+
+    def seed_empty_cells(self):
+        #the vacancy pool in the same arrays and order as ArrayCellSet, so the compiled round can update it
+        num_empty = self.grid_size ** 2 - self.num_agents
+        self.empty_cells = self.open_array('empty_cells', (max(num_empty, 1), 2), np.int64)
+        self.positions = self.open_array('positions', (self.grid_size, self.grid_size), np.int64)
+        self.pool_size = 0
+        for start, stop in self.strips():
+            self.positions[start:stop] = -1
+            cells = np.argwhere(self.grid[start:stop] == self.empty)
+            cells[:, 0] += start
+            self.empty_cells[self.pool_size:self.pool_size + len(cells)] = cells
+            self.positions[cells[:, 0], cells[:, 1]] = np.arange(self.pool_size, self.pool_size + len(cells))
+            self.pool_size += len(cells)
+        self.movers = self.open_array('movers', (max(self.num_agents, 1),), np.int64)
+
+    def read_strip(self, start, stop):
+        return read_strip(self.grid, self.neighbourhood, start, stop)
+
+    def strip_satisfaction(self, start, stop):
+        return strip_satisfaction(self.template, self.grid, start, stop)
+
+    def update_dissatisfied_agents(self):
+        #flat indices of the dissatisfied agents in row-major order, streamed into the movers file
+        self.grid_version += 1
+        self.num_dissatisfied = 0
+        total = 0.0
+        for start, stop in self.strips():
+            satisfaction = self.strip_satisfaction(start, stop)
+            cells = np.flatnonzero(~(satisfaction >= self.threshold)) + start * self.grid_size
+            self.movers[self.num_dissatisfied:self.num_dissatisfied + len(cells)] = cells
+            self.num_dissatisfied += len(cells)
+            total += float(np.sum(satisfaction))
+        self.satisfaction_total = (self.grid_version, total)
+
+    def step(self):
+        #the in-memory model's round: the draws come off the stream in the same order, a chunk at a time
+        moves = 0
+        torus = self.neighbourhood.boundary == 'torus'
+        counts = np.zeros((1, 1, 1), dtype=np.int8)
+        layers = np.zeros((1, 1), dtype=bool)
+        for start in range(0, self.num_dissatisfied, self.chunk_size):
+            if self.pool_size == 0:
+                break
+            cells = np.array(self.movers[start:min(start + self.chunk_size, self.num_dissatisfied)])
+            movers = np.stack(np.divmod(cells, self.grid_size), axis=1)
+            draws = self.rng.random(len(movers))
+            destinations = np.zeros(movers.shape, dtype=np.int64)
+            moves += self.relocate_random(self.grid, movers, draws, self.empty_cells, self.positions, self.pool_size,
+                                          self.empty, counts, layers, False, self.neighbourhood.offset_array,
+                                          torus, destinations)
+        if moves:
+            self.update_dissatisfied_agents()
+        return moves > 0
+
+    def get_dissatisfied_agents(self):
+        #row-major (x, y) cells, read from the movers file a chunk at a time
+        for start in range(0, self.num_dissatisfied, self.chunk_size):
+            cells = np.array(self.movers[start:min(start + self.chunk_size, self.num_dissatisfied)])
+            yield from zip(*(index.tolist() for index in np.divmod(cells, self.grid_size)))
+
+    def satisfaction_sum(self):
+        #sum of the satisfaction field, kept from the last rescan while the grid hasn't changed
+        version, total = self.satisfaction_total
+        if version != self.grid_version:
+            total = sum(float(np.sum(self.strip_satisfaction(start, stop))) for start, stop in self.strips())
+            self.satisfaction_total = (self.grid_version, total)
+        return total
+
+    def calculate_satisfaction(self):
+        satisfied_agents = self.num_agents - self.num_dissatisfied
+        return round((satisfied_agents / self.num_agents) * 100, 2) if self.num_agents > 0 else 100
+
+    def flush(self):
+        for array in (self.grid, self.empty_cells, self.positions, self.movers):
+            array.flush()
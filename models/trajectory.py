@@ -0,0 +1,106 @@
+import numpy as np
+from utils import EMPTY
+
+
+def apply_moves(grid, moves, empty=EMPTY):
+    #one round of (source x, source y, destination x, destination y) moves at once
+    #movers start the round occupied and vacancies start it empty, so no cell is a destination before it's a source
+    agents = grid[moves[:, 0], moves[:, 1]]
+    grid[moves[:, 0], moves[:, 1]] = empty
+    grid[moves[:, 2], moves[:, 3]] = agents
+
+
+def undo_moves(grid, moves, empty=EMPTY):
+    agents = grid[moves[:, 2], moves[:, 3]]
+    grid[moves[:, 2], moves[:, 3]] = empty
+    grid[moves[:, 0], moves[:, 1]] = agents
+
+
+class TrajectoryRecorder:
+    #records a run as its first grid plus the moves of every round, with a full grid every keyframe_interval rounds
+    def __init__(self, model, keyframe_interval=100):
+        self.model = model
+        self.keyframe_interval = keyframe_interval
+        model.trajectory_recorder = self
+        self.reset()
+
+    def reset(self):
+        self.initial_grid = self.model.grid.copy()
+        self.round_moves = []
+        self.keyframes = {0: self.initial_grid}
+        self.pending = []
+        self.pending_array = None
+
+    def record_move(self, source, destination):
+        self.pending.append((*source, *destination))
+
+    def record_moves(self, sources, destinations):
+        #a whole round from the compiled step
+        self.pending_array = np.hstack([sources, destinations])
+
+    def end_round(self):
+        if self.pending_array is not None:
+            moves = self.pending_array
+        else:
+            moves = np.array(self.pending)
+        self.round_moves.append(moves.reshape(-1, 4).astype(np.int32))
+        self.pending = []
+        self.pending_array = None
+        if len(self.round_moves) % self.keyframe_interval == 0:
+            self.keyframes[len(self.round_moves)] = self.model.grid.copy()
+
+    def trajectory(self):
+        return Trajectory(self.initial_grid, self.round_moves, self.keyframes, self.model.empty)
+
+    def save(self, path):
+        self.trajectory().save(path)
+
+
+class Trajectory:
+    #recorded run that can be scrubbed to any round without re-simulating
+    def __init__(self, initial_grid, round_moves, keyframes=None, empty=EMPTY):
+        self.initial_grid = initial_grid
+        self.round_moves = round_moves
+        self.keyframes = dict(keyframes or {})
+        self.keyframes[0] = initial_grid
+        self.empty = empty
+        self.current_round = 0
+        self.current_grid = initial_grid.copy()
+
+    @property
+    def num_rounds(self):
+        return len(self.round_moves)
+
+    def grid_at(self, round_number):
+        #grid after round_number rounds, walks from the current position or the nearest earlier keyframe
+        round_number = min(max(int(round_number), 0), self.num_rounds)
+        keyframe = max(key for key in self.keyframes if key <= round_number)
+        if not keyframe <= self.current_round or abs(round_number - self.current_round) > round_number - keyframe:
+            self.current_grid = self.keyframes[keyframe].copy()
+            self.current_round = keyframe
+        while self.current_round < round_number:
+            apply_moves(self.current_grid, self.round_moves[self.current_round], self.empty)
+            self.current_round += 1
+        while self.current_round > round_number:
+            self.current_round -= 1
+            undo_moves(self.current_grid, self.round_moves[self.current_round], self.empty)
+        return self.current_grid
+
+    def save(self, path):
+        lengths = [len(moves) for moves in self.round_moves]
+        keyframe_rounds = sorted(self.keyframes)
+        np.savez_compressed(path, initial_grid=self.initial_grid,
+                            moves=np.concatenate(self.round_moves) if self.round_moves else np.zeros((0, 4), np.int32),
+                            offsets=np.cumsum([0] + lengths),
+                            keyframe_rounds=np.array(keyframe_rounds),
+                            keyframes=np.stack([self.keyframes[key] for key in keyframe_rounds]),
+                            empty=np.array(self.empty))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            offsets = data['offsets']
+            moves = data['moves']
+            round_moves = [moves[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+            keyframes = dict(zip(data['keyframe_rounds'].tolist(), data['keyframes']))
+            return cls(data['initial_grid'], round_moves, keyframes, int(data['empty']))
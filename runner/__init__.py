@@ -0,0 +1,4 @@
+from .batch_runner import expand_sweep, run_single, run_sweep
+from .results_store import ResultsWriter, ResultsStore
+
+__all__ = ['expand_sweep', 'run_single', 'run_sweep', 'ResultsWriter', 'ResultsStore']
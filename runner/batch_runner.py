@@ -0,0 +1,134 @@
+import inspect
+import itertools
+from multiprocessing import Pool
+import numpy as np
+from models import SchellingModel, SchellingIncomeModel, ConvergenceDetector
+from measures import CompositeSegregationMeasure, MeasureCache
+
+
+MODELS = {
+    'schelling': SchellingModel,
+    'income': SchellingIncomeModel,
+}
+
+
+def model_parameters(model_class):
+    #keyword arguments the model constructor accepts, seeds come from the sweep instead
+    return set(inspect.signature(model_class.__init__).parameters) - {'self', 'seed'}
+
+
+def child_seed(entropy, index):
+    #independent stream for run index, the same one SeedSequence(entropy).spawn() hands out in that position
+    return np.random.SeedSequence(entropy, spawn_key=(index,))
+
+
+def expand_sweep(spec):
+    #spec maps each parameter to a list of values, 'model' picks the model(s) to sweep
+    #parameters a model doesn't take (e.g. gini_coefficient for SchellingModel) are left out instead of duplicating runs,
+    #parameters none of the swept models take are most likely misspelt and rejected
+    model_names = spec.get('model', ['schelling'])
+    for model_name in model_names:
+        if model_name not in MODELS:
+            raise ValueError(f"unknown model {model_name!r}, expected one of {sorted(MODELS)}")
+    accepted_by_any = set().union(*(model_parameters(MODELS[model_name]) for model_name in model_names))
+    unknown = sorted(set(spec) - accepted_by_any - {'model'})
+    if unknown:
+        raise ValueError(f"no swept model takes {', '.join(unknown)}")
+
+    configurations = []
+    for model_name in model_names:
+        accepted = model_parameters(MODELS[model_name])
+        names = sorted(name for name in spec if name != 'model' and name in accepted)
+        for values in itertools.product(*(spec[name] for name in names)):
+            configurations.append({'model': model_name, **dict(zip(names, values))})
+    return configurations
+
+
+def measure_values(measure):
+    #indices and composite axes of a CompositeSegregationMeasure, an index that divides by zero (dissimilarity with a
+    #single income group, e.g. gini_coefficient below 0.03) is nan and named in measure_error instead of ending the sweep
+    indices = {}
+    failed = []
+    for name in ('isolation_index', 'morans_i', 'dissimilarity_index'):
+        try:
+            indices[name] = getattr(measure, 'calculate_' + name)()
+        except ZeroDivisionError:
+            indices[name] = np.nan
+            failed.append(name)
+    values = measure.composite_from_indices(indices['isolation_index'], indices['morans_i'],
+                                            indices['dissimilarity_index'])
+    values['measure_error'] = f"division by zero in {', '.join(failed)}" if failed else None
+    return values
+
+
+def round_record(model, rounds, measure_cache):
+    #one row of the per-round table, with the segregation measures when measure_cache is given
+    record = {'round': rounds, 'satisfaction': model.calculate_satisfaction(),
+              'dissatisfied': len(model.dissatisfied_agents)}
+    if measure_cache is not None:
+        record.update(measure_values(measure_cache.current_measure()))
+    return record
+
+
+def run_single(task):
+    #runs one replicate until step() returns False or max_rounds is reached
+    #convergence holds ConvergenceDetector keyword arguments, runs that plateau or cycle then stop early
+    #with record_rounds the result's 'round_records' has a record for the initial grid and every round after it, each
+    #with the run's configuration columns, so per-round rows can be filtered on parameters like the final results
+    configuration, replicate, entropy, index, max_rounds, measure, convergence, record_rounds = task
+
+    parameters = {name: value for name, value in configuration.items() if name != 'model'}
+    model = MODELS[configuration['model']](**parameters, seed=child_seed(entropy, index))
+    if convergence is not None:
+        ConvergenceDetector(model, **convergence)
+    measure_cache = MeasureCache(model) if record_rounds and measure else None
+    run_key = {**configuration, 'replicate': replicate, 'seed': entropy, 'spawn_key': index}
+    round_records = [{**run_key, **round_record(model, 0, measure_cache)}] if record_rounds else None
+
+    rounds = 0
+    termination_reason = 'max_rounds'
+    while rounds < max_rounds:
+        stepped = model.step()
+        if model.termination_reason != 'converged': #agents moved, even in a round the detector ended the run on
+            rounds += 1
+            if record_rounds:
+                round_records.append({**run_key, **round_record(model, rounds, measure_cache)})
+        if not stepped:
+            termination_reason = model.termination_reason
+            break
+
+    result = {**run_key, 'rounds': rounds,
+              'converged': termination_reason == 'converged', 'termination_reason': termination_reason,
+              'satisfaction': model.calculate_satisfaction()}
+    if measure:
+        composite_measure = CompositeSegregationMeasure(model.grid, model.num_agent_types, model.empty_ratio,
+                                                        isinstance(model, SchellingIncomeModel),
+                                                        **model.neighbourhood.parameters())
+        result.update(measure_values(composite_measure))
+    if record_rounds:
+        result['round_records'] = round_records
+    return result
+
+
+def make_tasks(spec, replicates=1, seed=None, max_rounds=1000, measure=True, convergence=None, record_rounds=False):
+    #one task per configuration and replicate, each with its own child of the sweep's seed sequence
+    entropy = np.random.SeedSequence(seed).entropy #fresh entropy when seed is None, recorded so the sweep can be repeated
+    index = 0
+    for configuration in expand_sweep(spec):
+        for replicate in range(replicates):
+            yield configuration, replicate, entropy, index, max_rounds, measure, convergence, record_rounds
+            index += 1
+
+
+def run_sweep(spec, replicates=1, processes=None, seed=None, max_rounds=1000, measure=True, convergence=None,
+              record_rounds=False):
+    #yields each run's result as soon as it finishes, in completion order
+    tasks = make_tasks(spec, replicates, seed, max_rounds, measure, convergence, record_rounds)
+    if processes == 1:
+        for task in tasks:
+            yield run_single(task)
+        return
+
+    with Pool(processes) as pool:
+        for result in pool.imap_unordered(run_single, tasks):
+            yield result
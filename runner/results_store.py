@@ -0,0 +1,128 @@
+import numbers
+import os
+from pathlib import Path
+import numpy as np
+
+
+def chunk_path(directory, number):
+    return Path(directory) / f"chunk-{number:06d}.npz"
+
+
+def column_array(values):
+    #booleans, integers, floats (missing values become nan) or strings (missing values become ''), never pickled objects
+    types = {type(value) for value in values if value is not None} #checked per type, not per value
+    complete = None not in values
+    if types and complete and all(issubclass(kind, (bool, np.bool_)) for kind in types):
+        return np.array(values, dtype=bool)
+    if all(issubclass(kind, numbers.Real) and not issubclass(kind, (bool, np.bool_)) for kind in types):
+        present = [value for value in values if value is not None]
+        integers = all(issubclass(kind, numbers.Integral) for kind in types)
+        if types and complete and integers and -2 ** 63 <= min(present) and max(present) < 2 ** 63:
+            return np.array(values, dtype=np.int64)
+        if not integers or not present or max(abs(min(present)), abs(max(present))) < 2 ** 53: #exact as floats
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    #strings, and integers too wide for int64 such as seed sequence entropy
+    return np.array(['' if value is None else str(value) for value in values], dtype=str)
+
+
+def missing_column(like, rows):
+    #fill for a column a chunk doesn't have
+    if like is not None and like.dtype.kind in 'US':
+        return np.full(rows, '', dtype=like.dtype)
+    return np.full(rows, np.nan)
+
+
+class ResultsWriter:
+    #append-only columnar store: records are buffered and written chunk_rows at a time, one compressed .npz file per
+    #chunk with an array per column, so memory stays bounded however many records a sweep streams through it
+    #reopening a directory appends after its existing chunks, a chunk only appears once it has been fully written
+    def __init__(self, directory, chunk_rows=10000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.chunk_rows = chunk_rows
+        self.next_chunk = len(ResultsStore(self.directory).chunk_paths())
+        self.records = []
+        self.rows_written = 0
+
+    def append(self, record):
+        #record maps column names to scalars, records may have different columns
+        self.records.append(record)
+        if len(self.records) >= self.chunk_rows:
+            self.flush()
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def flush(self):
+        if not self.records:
+            return
+        names = list(dict.fromkeys(name for record in self.records for name in record)) #first-seen order
+        columns = {name: column_array([record.get(name) for record in self.records]) for name in names}
+        path = chunk_path(self.directory, self.next_chunk)
+        partial = path.with_name(path.stem + '.partial.npz')
+        np.savez_compressed(partial, **columns)
+        os.replace(partial, path) #readers never see a half-written chunk
+        self.next_chunk += 1
+        self.rows_written += len(self.records)
+        self.records = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ResultsStore:
+    #reads a ResultsWriter directory a chunk at a time, loading only the columns asked for
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def chunk_paths(self):
+        return sorted(path for path in self.directory.glob('chunk-*.npz') if not path.name.endswith('.partial.npz'))
+
+    def columns(self):
+        #column names in first-seen order, read from the chunks' indexes without loading any arrays
+        names = {}
+        for path in self.chunk_paths():
+            with np.load(path) as chunk:
+                names.update(dict.fromkeys(chunk.files))
+        return list(names)
+
+    def iter_chunks(self, columns=None, where=None):
+        #yields (rows, {column: array}) per chunk with the columns it has, where takes the chunk (its columns load on
+        #access) and returns a mask of the rows to keep
+        for path in self.chunk_paths():
+            with np.load(path) as chunk:
+                names = chunk.files if columns is None else [name for name in columns if name in chunk.files]
+                values = {name: chunk[name] for name in names}
+                if where is not None:
+                    mask = np.asarray(where(chunk), dtype=bool)
+                    values = {name: value[mask] for name, value in values.items()}
+                    rows = int(np.count_nonzero(mask))
+                else:
+                    rows = len(values[names[0]]) if names else len(chunk[chunk.files[0]])
+            yield rows, values
+
+    def read(self, columns=None, where=None):
+        #the selected rows and columns of every chunk concatenated, e.g.
+        #store.read(['threshold', 'rounds'], where=lambda chunk: chunk['termination_reason'] == 'plateau')
+        chunks = list(self.iter_chunks(columns, where))
+        names = columns if columns is not None else list(dict.fromkeys(name for _, values in chunks for name in values))
+        result = {}
+        for name in names:
+            like = next((values[name] for _, values in chunks if name in values), None)
+            pieces = [values[name] if name in values else missing_column(like, rows) for rows, values in chunks]
+            result[name] = np.concatenate(pieces) if pieces else np.array([])
+        return result
+
+    def __len__(self):
+        total = 0
+        for path in self.chunk_paths():
+            with np.load(path) as chunk:
+                total += len(chunk[chunk.files[0]])
+        return total
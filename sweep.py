@@ -0,0 +1,62 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+from runner import run_sweep, ResultsWriter
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run Schelling model parameter sweeps without the GUI.")
+    parser.add_argument("spec", help='JSON file mapping parameters to lists of values, e.g. {"model": ["schelling"], "threshold": [0.3, 0.5]}')
+    parser.add_argument("--replicates", type=int, default=1, help="runs per parameter combination")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: one per core, 1 runs in this process)")
+    parser.add_argument("--seed", type=int, default=None, help="sweep seed, run i gets child i of its SeedSequence")
+    parser.add_argument("--max-rounds", type=int, default=1000, help="round cap for runs that don't converge")
+    parser.add_argument("--stop-on-plateau", action="store_true", help="end runs whose satisfaction stops improving or whose grid repeats")
+    parser.add_argument("--window", type=int, default=50, help="rounds without a new satisfaction low or high before a run is ended")
+    parser.add_argument("--tolerance", type=float, default=0.001, help="relative margin a new low or high has to beat the old one by")
+    parser.add_argument("--no-measure", action="store_true", help="skip the composite segregation measure")
+    parser.add_argument("--output", default=None, help="JSON lines file to write results to (default: stdout, unless --store is given)")
+    parser.add_argument("--store", default=None, help="directory to append results to as compressed column chunks, runs/ has one row per run")
+    parser.add_argument("--rounds", action="store_true", help="also store a row per round of every run in rounds/ (needs --store)")
+    parser.add_argument("--chunk-rows", type=int, default=10000, help="rows per stored chunk file")
+    args = parser.parse_args()
+    if args.rounds and args.store is None:
+        parser.error("--rounds needs --store")
+    return args
+
+
+def main():
+    args = parse_args()
+    with open(args.spec) as spec_file:
+        spec = json.load(spec_file)
+
+    convergence = {'window': args.window, 'tolerance': args.tolerance} if args.stop_on_plateau else None
+    if args.output:
+        output = open(args.output, "w")
+    else:
+        output = sys.stdout if args.store is None else None
+    runs = ResultsWriter(Path(args.store) / "runs", args.chunk_rows) if args.store else None
+    rounds = ResultsWriter(Path(args.store) / "rounds", args.chunk_rows) if args.rounds else None
+    try:
+        for result in run_sweep(spec, replicates=args.replicates, processes=args.processes, seed=args.seed,
+                                max_rounds=args.max_rounds, measure=not args.no_measure, convergence=convergence,
+                                record_rounds=args.rounds):
+            if rounds is not None:
+                rounds.extend(result.pop('round_records'))
+            if runs is not None:
+                runs.append(result)
+            if output is not None:
+                output.write(json.dumps(result) + "\n")
+                output.flush() #results stream out as runs finish
+    finally:
+        #whatever is still buffered is written, so an interrupted sweep keeps the runs it finished
+        for writer in (runs, rounds):
+            if writer is not None:
+                writer.close()
+        if output is not None and output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from models import SchellingModel, SchellingIncomeModel, SchellingEnsemble
+from measures import CompositeSegregationMeasure
+
+pytest.importorskip('numba')
+
+
+def paired_models(model_class, **parameters):
+    return [model_class(grid_size=30, threshold=0.6, num_agent_types=3, seed=7, backend=backend, **parameters)
+            for backend in ('python', 'numba')]
+
+
+@pytest.mark.parametrize('model_class', [SchellingModel, SchellingIncomeModel])
+@pytest.mark.parametrize('parameters', [{}, {'incremental': True}, {'radius': 2, 'boundary': 'torus'},
+                                        {'radius': 3, 'neighbourhood_shape': 'von_neumann', 'incremental': True}])
+def test_numba_rounds_match_python(model_class, parameters):
+    python, numba = paired_models(model_class, **parameters)
+    for _ in range(8):
+        assert python.step() == numba.step()
+        assert np.array_equal(python.grid, numba.grid)
+        assert sorted(python.dissatisfied_agents) == sorted(numba.dissatisfied_agents)
+    assert python.rng.random() == numba.rng.random() #the same draws were taken
+
+
+@pytest.mark.parametrize('model_class', [SchellingModel, SchellingIncomeModel])
+def test_numba_measures_match_python(model_class):
+    model, _ = paired_models(model_class)
+    for _ in range(3):
+        model.step()
+    python, numba = [CompositeSegregationMeasure(model.grid, model.num_agent_types, model.empty_ratio,
+                                                 model_class is SchellingIncomeModel, backend=backend)
+                     for backend in ('python', 'numba')]
+    assert python.calculate_morans_i() == numba.calculate_morans_i()
+    assert python.calculate_dissimilarity_index() == numba.calculate_dissimilarity_index()
+
+
+def test_ensemble_matches_across_backends():
+    python, numba = [SchellingEnsemble(replicates=4, grid_size=20, threshold=0.5, seed=3, backend=backend)
+                     for backend in ('python', 'numba')]
+    for _ in range(5):
+        assert np.array_equal(python.step(), numba.step())
+        assert np.array_equal(python.grids, numba.grids)
@@ -0,0 +1,37 @@
+import math
+import pytest
+import numpy as np
+from runner import expand_sweep, run_sweep, ResultsWriter, ResultsStore
+
+
+def test_single_income_group_run_records_nan():
+    #below a gini coefficient of 0.03 every agent is in one income group, which the dissimilarity index divides by
+    results = sorted(run_sweep({'model': ['income'], 'gini_coefficient': [0.0, 0.34], 'grid_size': [20]}, processes=1,
+                               seed=0, max_rounds=50), key=lambda result: result['gini_coefficient'])
+    assert math.isnan(results[0]['dissimilarity_index']) and math.isnan(results[0]['composite_y'])
+    assert results[0]['measure_error'] == 'division by zero in dissimilarity_index'
+    assert not math.isnan(results[1]['dissimilarity_index']) and results[1]['measure_error'] is None
+
+
+def test_unknown_spec_keys_are_rejected():
+    with pytest.raises(ValueError):
+        expand_sweep({'threshhold': [0.3]})
+    with pytest.raises(ValueError):
+        expand_sweep({'model': ['schelling_model']})
+    #taken by one of the swept models is enough
+    assert len(expand_sweep({'model': ['schelling', 'income'], 'gini_coefficient': [0.1, 0.2]})) == 3
+
+
+def test_round_records_carry_their_configuration(tmp_path):
+    spec = {'model': ['schelling'], 'grid_size': [15], 'threshold': [0.3, 0.6]}
+    with ResultsWriter(tmp_path, chunk_rows=7) as writer:
+        for result in run_sweep(spec, replicates=2, processes=1, seed=0, max_rounds=10, record_rounds=True):
+            writer.extend(result.pop('round_records'))
+
+    store = ResultsStore(tmp_path)
+    rows = store.read(['model', 'grid_size', 'threshold', 'replicate', 'round'],
+                      where=lambda chunk: chunk['threshold'] == 0.6)
+    assert len(rows['round']) > 0 and set(rows['model']) == {'schelling'} and set(rows['grid_size']) == {15}
+    assert set(rows['replicate']) == {0, 1} and np.all(rows['threshold'] == 0.6)
+    other_rows = store.read(['round'], where=lambda chunk: chunk['threshold'] == 0.3)
+    assert len(store) == len(rows['round']) + len(other_rows['round'])
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from models import (SchellingModel, SchellingIncomeModel, TrajectoryRecorder, Trajectory, save_checkpoint,
+                    load_checkpoint)
+from models.compiled import NUMBA_AVAILABLE
+
+
+RUNS = [(SchellingModel, {}), (SchellingModel, {'incremental': True}), (SchellingModel, {'relocation': 'best_of_k'}),
+        (SchellingModel, {'update_mode': 'synchronous'}), (SchellingIncomeModel, {}),
+        (SchellingIncomeModel, {'incremental': True, 'radius': 2, 'boundary': 'torus'}),
+        (SchellingIncomeModel, {'relocation': 'nearest_satisfying'})]
+if NUMBA_AVAILABLE:
+    RUNS += [(SchellingModel, {'backend': 'numba'}), (SchellingIncomeModel, {'backend': 'numba', 'incremental': True})]
+
+
+@pytest.mark.parametrize('model_class, parameters', RUNS)
+def test_resumed_run_matches_uninterrupted_run(tmp_path, model_class, parameters):
+    uninterrupted = model_class(grid_size=25, threshold=0.6, num_agent_types=3, seed=11, **parameters)
+    interrupted = model_class(grid_size=25, threshold=0.6, num_agent_types=3, seed=11, **parameters)
+    for _ in range(3):
+        uninterrupted.step()
+        interrupted.step()
+    save_checkpoint(interrupted, tmp_path / 'checkpoint.npz')
+    resumed = load_checkpoint(tmp_path / 'checkpoint.npz')
+    assert type(resumed) is model_class and np.array_equal(resumed.grid, uninterrupted.grid)
+
+    for _ in range(6):
+        assert resumed.step() == uninterrupted.step()
+        assert np.array_equal(resumed.grid, uninterrupted.grid)
+        assert sorted(resumed.dissatisfied_agents) == sorted(uninterrupted.dissatisfied_agents)
+    assert resumed.rng.random() == uninterrupted.rng.random()
+
+
+@pytest.mark.parametrize('update_mode', ['sequential', 'synchronous'])
+@pytest.mark.parametrize('keyframe_interval', [3, 100])
+def test_grid_at_replays_recorded_grids(tmp_path, update_mode, keyframe_interval):
+    model = SchellingIncomeModel(grid_size=20, threshold=0.6, num_agent_types=3, seed=5, update_mode=update_mode)
+    recorder = TrajectoryRecorder(model, keyframe_interval=keyframe_interval)
+    grids = [model.grid.copy()]
+    for _ in range(12):
+        if not model.step():
+            break
+        grids.append(model.grid.copy())
+    recorder.save(tmp_path / 'trajectory.npz')
+
+    for trajectory in (recorder.trajectory(), Trajectory.load(tmp_path / 'trajectory.npz')):
+        assert trajectory.num_rounds == len(grids) - 1
+        #forwards one round at a time, backwards one round at a time, then jumps either way
+        order = list(range(len(grids))) + list(range(len(grids) - 1, -1, -1)) + [len(grids) - 1, 0, 5, 2, 9, 1]
+        for round_number in order:
+            assert np.array_equal(trajectory.grid_at(round_number), grids[min(round_number, len(grids) - 1)])
@@ -0,0 +1,19 @@
+from models import SchellingModel, SchellingIncomeModel, ConvergenceDetector
+
+
+def test_undefined_measure_never_plateaus():
+    #every agent is in one income group below a gini coefficient of 0.03, so the dissimilarity index divides by zero
+    model = SchellingIncomeModel(grid_size=20, threshold=0.8, gini_coefficient=0.0, seed=0)
+    detector = ConvergenceDetector(model, window=5, track=('dissimilarity_index',), detect_cycles=False)
+    for _ in range(20):
+        assert model.step()
+    assert model.termination_reason is None and detector.extremes == {}
+
+
+def test_defined_measure_still_plateaus():
+    model = SchellingModel(grid_size=20, threshold=0.8, seed=0)
+    ConvergenceDetector(model, window=5, track=('dissimilarity_index',), detect_cycles=False)
+    rounds = 0
+    while model.step():
+        rounds += 1
+    assert model.termination_reason == 'plateau' and rounds < 100
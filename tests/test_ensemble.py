@@ -0,0 +1,14 @@
+import pytest
+from models import SchellingEnsemble
+
+
+@pytest.mark.parametrize('parameters', [{'relocation': 'best_of_k'}, {'relocation': 'nearest_satisfying'},
+                                        {'incremental': True}])
+def test_ensemble_rejects_what_it_does_not_run(parameters):
+    with pytest.raises(ValueError):
+        SchellingEnsemble(replicates=2, grid_size=10, **parameters)
+
+
+def test_ensemble_accepts_its_defaults_spelled_out():
+    ensemble = SchellingEnsemble(replicates=2, grid_size=10, seed=0, relocation='random', incremental=False)
+    assert ensemble.run(max_rounds=5).shape == (2,)
@@ -0,0 +1,171 @@
+from itertools import combinations
+import numpy as np
+import pytest
+from models import SchellingModel, SchellingIncomeModel
+from models.compiled import NUMBA_AVAILABLE
+from models.neighbourhood import Neighbourhood
+from measures import CompositeSegregationMeasure
+
+
+#reference loops, cell by cell as the measures were first written, generalised to any neighbourhood
+
+def loop_satisfaction(model):
+    #is_satisfied for every cell, the reference the whole-grid satisfaction field has to match
+    return np.array([[float(model.is_satisfied(x, y)) for y in range(model.grid_size)]
+                     for x in range(model.grid_size)])
+
+
+def loop_attributes(agent, is_income_model):
+    agent = int(agent)
+    return (agent // 10, agent % 10) if is_income_model else (agent, 0)
+
+
+def loop_morans_i(grid, empty_ratio, is_income_model, radius=1, boundary='clip'):
+    weights = Neighbourhood(radius, 'von_neumann', boundary)
+    size = grid.shape[0]
+    num_agents = size ** 2 - int(size ** 2 * empty_ratio)
+    agents = {(x, y): loop_attributes(grid[x, y], is_income_model)
+              for x in range(size) for y in range(size) if grid[x, y] != -1}
+    types = np.array([agent_type for agent_type, _ in agents.values()])
+    incomes = np.array([income for _, income in agents.values()])
+    if is_income_model and (np.std(types) == 0 or np.std(incomes) == 0):
+        return 0
+
+    type_mean, type_std, income_mean, income_std = np.mean(types), np.std(types), np.mean(incomes), np.std(incomes)
+
+    def composite(cell):
+        agent_type, income = agents[cell]
+        if not is_income_model:
+            return agent_type - type_mean
+        return ((agent_type - type_mean) / type_std + (income - income_mean) / income_std) / 2
+
+    numerator = denominator = W = 0
+    for (x, y) in agents:
+        denominator += composite((x, y)) ** 2
+        for nx, ny in weights.neighbour_list(x, y, size):
+            if 0 <= nx < size and 0 <= ny < size and (nx, ny) in agents:
+                W += 1
+                numerator += composite((x, y)) * composite((nx, ny))
+    if W == 0 or denominator == 0:
+        return 0
+    return (num_agents * numerator) / (W * denominator)
+
+
+def loop_pair_differences(rows, totals, groups):
+    diff_sum = permutations = 0
+    for counts in rows:
+        for i, j in combinations(groups, 2):
+            if counts.get(i, 0) and counts.get(j, 0):
+                diff_sum += abs(counts[i] / totals[i] - counts[j] / totals[j])
+                permutations += 1
+    return diff_sum / permutations
+
+
+def loop_dissimilarity_index(grid, num_agent_types, is_income_model):
+    type_rows, income_rows = [{} for _ in grid], [{} for _ in grid]
+    type_totals, income_totals = {}, {}
+    for x, row in enumerate(grid):
+        for agent in row:
+            if agent == -1:
+                continue
+            agent_type, income = loop_attributes(agent, is_income_model)
+            type_rows[x][agent_type] = type_rows[x].get(agent_type, 0) + 1
+            type_totals[agent_type] = type_totals.get(agent_type, 0) + 1
+            income_rows[x][income] = income_rows[x].get(income, 0) + 1
+            income_totals[income] = income_totals.get(income, 0) + 1
+    agent_diff = loop_pair_differences(type_rows, type_totals, range(1, num_agent_types + 1))
+    if not is_income_model:
+        return agent_diff / 2
+    return (agent_diff + loop_pair_differences(income_rows, income_totals, list(income_totals))) / 4
+
+
+def check_measures(model, is_income_model, backend='python'):
+    #satisfaction field and all three measures against the loops
+    expected = loop_satisfaction(model)
+    assert np.array_equal(model.satisfaction_ratios(), expected)
+    assert sorted(model.dissatisfied_agents) == [tuple(cell) for cell in np.argwhere(expected < model.threshold).tolist()]
+    measure = CompositeSegregationMeasure(model.grid, model.num_agent_types, model.empty_ratio, is_income_model,
+                                          backend=backend, **model.neighbourhood.parameters())
+    parameters = model.neighbourhood.parameters()
+    assert measure.calculate_isolation_index() == pytest.approx(np.mean(expected), rel=1e-12)
+    assert measure.calculate_morans_i() == pytest.approx(
+        loop_morans_i(model.grid, model.empty_ratio, is_income_model, parameters['radius'], parameters['boundary']),
+        rel=1e-9, abs=1e-12)
+    assert measure.calculate_dissimilarity_index() == pytest.approx(
+        loop_dissimilarity_index(model.grid, model.num_agent_types, is_income_model), rel=1e-12)
+
+
+@pytest.mark.parametrize('model_class', [SchellingModel, SchellingIncomeModel])
+@pytest.mark.parametrize('num_agent_types', [2, 3])
+@pytest.mark.parametrize('boundary', ['clip', 'torus'])
+@pytest.mark.parametrize('shape', ['moore', 'von_neumann'])
+@pytest.mark.parametrize('radius', [1, 2, 3, 4])
+def test_vectorised_matches_loops(model_class, num_agent_types, boundary, shape, radius):
+    #on the initial grid and again after some rounds have moved agents
+    model = model_class(grid_size=16, threshold=0.5, num_agent_types=num_agent_types, radius=radius,
+                        neighbourhood_shape=shape, boundary=boundary, seed=radius)
+    is_income_model = model_class is SchellingIncomeModel
+    check_measures(model, is_income_model)
+    for _ in range(3):
+        model.step()
+    check_measures(model, is_income_model)
+
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason="numba is not installed")
+@pytest.mark.parametrize('model_class', [SchellingModel, SchellingIncomeModel])
+@pytest.mark.parametrize('boundary', ['clip', 'torus'])
+@pytest.mark.parametrize('radius', [1, 2, 3, 4])
+def test_compiled_matches_loops(model_class, boundary, radius):
+    model = model_class(grid_size=16, threshold=0.5, num_agent_types=3, radius=radius, boundary=boundary, seed=radius,
+                        backend='numba')
+    for _ in range(3):
+        model.step()
+    check_measures(model, model_class is SchellingIncomeModel, backend='numba')
+
+
+def test_income_satisfaction_radius_4():
+    #80 neighbours at moore radius 4, twice that overflowed the int8 counts
+    model = SchellingIncomeModel(grid_size=20, radius=4, seed=0)
+    expected = loop_satisfaction(model)
+    assert np.array_equal(model.satisfaction_ratios(), expected)
+    assert expected.min() >= 0
+
+    measure = CompositeSegregationMeasure(model.grid, model.num_agent_types, model.empty_ratio, True,
+                                          **model.neighbourhood.parameters())
+    assert measure.calculate_isolation_index() == np.mean(expected)
+
+
+def test_income_destination_scores_radius_4():
+    model = SchellingIncomeModel(grid_size=20, radius=4, relocation='best_of_k', seed=1)
+    source = tuple(np.argwhere(model.grid != model.empty)[0])
+    candidates = model.empty_cells.as_array()
+    scores = model.score_destinations(source, candidates)
+
+    #the satisfaction the agent would have after actually moving there
+    grid = model.grid
+    expected = []
+    for x, y in candidates.tolist():
+        model.grid = grid.copy()
+        model.grid[x, y], model.grid[source] = grid[source], model.empty
+        expected.append(model.is_satisfied(x, y))
+    model.grid = grid
+    assert np.array_equal(scores, expected)
+
+
+@pytest.mark.parametrize('num_agent_types', [10, 12, 127])
+def test_many_agent_types(num_agent_types):
+    #single attribute codes of 10 and up are agent types, not income codes
+    check_measures(SchellingModel(grid_size=24, num_agent_types=num_agent_types, seed=2), False)
+
+
+@pytest.mark.parametrize('num_agent_types', [5, 7, 12])
+def test_many_income_agent_types(num_agent_types):
+    #codes of 50 and up
+    check_measures(SchellingIncomeModel(grid_size=24, num_agent_types=num_agent_types, seed=3), True)
+
+
+def test_agent_types_beyond_the_grid_code():
+    with pytest.raises(ValueError):
+        SchellingIncomeModel(num_agent_types=13)
+    with pytest.raises(ValueError):
+        SchellingModel(num_agent_types=128)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from models import SchellingModel, SchellingIncomeModel
+from models.schelling_model import RESCAN_SHARE
+from measures import MeasureTracker
+
+
+def paired_models(model_class, grid_size=40, threshold=0.6, num_agent_types=3, **parameters):
+    return [model_class(grid_size=grid_size, threshold=threshold, empty_ratio=0.15, num_agent_types=num_agent_types,
+                        seed=5, incremental=incremental, **parameters) for incremental in (False, True)]
+
+
+def assert_same_rounds(rescan, incremental, rounds=15):
+    for _ in range(rounds):
+        assert rescan.step() == incremental.step()
+        assert np.array_equal(rescan.grid, incremental.grid)
+        assert sorted(rescan.dissatisfied_agents) == sorted(incremental.dissatisfied_agents)
+        assert np.array_equal(incremental.neighbour_counts, incremental.count_neighbours(incremental.grid))
+
+
+@pytest.mark.parametrize('model_class', [SchellingModel, SchellingIncomeModel])
+@pytest.mark.parametrize('relocation', ['random', 'best_of_k', 'nearest_satisfying'])
+@pytest.mark.parametrize('boundary', ['clip', 'torus'])
+@pytest.mark.parametrize('radius', [1, 3])
+def test_incremental_rounds_match_rescans(model_class, relocation, boundary, radius):
+    assert_same_rounds(*paired_models(model_class, relocation=relocation, boundary=boundary, radius=radius,
+                                      neighbourhood_shape='von_neumann' if radius == 3 else 'moore'))
+
+
+def test_incremental_rounds_with_a_measure_tracker():
+    #the tracker reads the counts during the round, so they are kept per move
+    models = paired_models(SchellingIncomeModel)
+    for model in models:
+        MeasureTracker(model)
+    assert_same_rounds(*models)
+
+
+def test_small_rounds_refresh_only_their_windows(monkeypatch):
+    #a single move is far below the rescan share, the round must not fall back to a full rescan
+    rescan, incremental = paired_models(SchellingModel, grid_size=100, threshold=0.4, num_agent_types=2)
+    while 2 * len(incremental.dissatisfied_agents) * len(incremental.neighbourhood.reach) >= RESCAN_SHARE * 100 ** 2:
+        rescan.step()
+        incremental.step()
+    monkeypatch.setattr(incremental, 'satisfaction_field', None)
+    assert_same_rounds(rescan, incremental, rounds=3)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import measures.measure_tracker
+from models import SchellingModel, SchellingIncomeModel
+from models.compiled import NUMBA_AVAILABLE
+from measures import CompositeSegregationMeasure, MeasureTracker
+
+
+def full_measures(model):
+    measure = CompositeSegregationMeasure(model.grid, model.num_agent_types, model.empty_ratio,
+                                          isinstance(model, SchellingIncomeModel), **model.neighbourhood.parameters())
+    return measure.calculate_isolation_index(), measure.calculate_morans_i(), measure.calculate_dissimilarity_index()
+
+
+@pytest.mark.parametrize('model_class', [SchellingModel, SchellingIncomeModel])
+@pytest.mark.parametrize('parameters', [{}, {'incremental': True}, {'relocation': 'best_of_k'},
+                                        {'update_mode': 'synchronous'}, {'radius': 2, 'boundary': 'torus'},
+                                        {'backend': 'numba'}])
+def test_tracked_series_match_full_measures(monkeypatch, model_class, parameters):
+    if parameters.get('backend') == 'numba' and not NUMBA_AVAILABLE:
+        pytest.skip("numba is not installed")
+    #every round is updated from the cells around its moves, never by a full refresh
+    monkeypatch.setattr(measures.measure_tracker, 'RESCAN_SHARE', float('inf'))
+    model = model_class(grid_size=40, threshold=0.6, empty_ratio=0.15, seed=4, **parameters)
+    tracker = MeasureTracker(model)
+    expected = [full_measures(model)]
+    for _ in range(10):
+        if model.step():
+            expected.append(full_measures(model))
+    series = tracker.series()
+    tracked = np.array([series['isolation_index'], series['morans_i'], series['dissimilarity_index']]).T
+    assert tracked == pytest.approx(np.array(expected), rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason="numba is not installed")
+def test_tracker_keeps_the_compiled_round():
+    #attaching a tracker no longer makes the model keep count planes or step in python
+    model = SchellingModel(grid_size=30, seed=1, backend='numba')
+    MeasureTracker(model)
+    model.python_step = None
+    assert model.step() and model.neighbour_counts is None
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from models import SchellingModel, SchellingIncomeModel, ParallelSchellingModel
+from measures import MeasureCache
+
+
+@pytest.fixture
+def parallel_model():
+    #closes every model the test opens, even when an assertion fails, so no shared memory is left behind
+    models = []
+
+    def open_model(*args, **kwargs):
+        models.append(ParallelSchellingModel(*args, **kwargs))
+        return models[-1]
+
+    yield open_model
+    for model in models:
+        model.close()
+
+
+def measures(model):
+    cache = MeasureCache(model)
+    return cache.isolation_index(), cache.morans_i(), cache.dissimilarity_index()
+
+
+@pytest.mark.parametrize('model_class', [SchellingModel, SchellingIncomeModel])
+@pytest.mark.parametrize('processes, strips', [(1, None), (2, None), (2, 3)])
+def test_parallel_model_matches_in_memory_model(parallel_model, model_class, processes, strips):
+    parameters = dict(grid_size=30, threshold=0.6, num_agent_types=3, seed=4)
+    reference = model_class(**parameters)
+    parallel = parallel_model(processes, model_class, strips=strips, **parameters)
+    assert np.array_equal(parallel.grid, reference.grid)
+    for _ in range(8):
+        assert parallel.step() == reference.step()
+        assert np.array_equal(parallel.grid, reference.grid)
+        assert parallel.get_dissatisfied_agents() == sorted(reference.get_dissatisfied_agents())
+        assert parallel.calculate_satisfaction() == reference.calculate_satisfaction()
+        assert measures(parallel.model) == measures(reference)
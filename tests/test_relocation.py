@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+from models import SchellingModel
+from utils import Instrumentation
+
+
+@pytest.mark.parametrize('relocation', ['random', 'best_of_k', 'nearest_satisfying'])
+def test_relocation_is_only_timed_with_instrumentation(relocation):
+    plain = SchellingModel(grid_size=20, threshold=0.6, relocation=relocation, seed=3)
+    timed = SchellingModel(grid_size=20, threshold=0.6, relocation=relocation, seed=3)
+    timed.instrumentation = Instrumentation()
+    for _ in range(3):
+        assert plain.step() == timed.step()
+        assert np.array_equal(plain.grid, timed.grid)
+        assert plain.relocation.seconds == 0.0
+        assert plain.relocation.moves == timed.relocation.moves
+    assert np.all(timed.instrumentation.values('relocate_seconds') > 0)
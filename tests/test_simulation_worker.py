@@ -0,0 +1,42 @@
+import threading
+import time
+from gui.simulation_worker import SimulationWorker
+
+
+class SlowModel:
+    #stands in for a model on a large grid, every round takes a while and never converges
+    termination_reason = None
+    grid = None
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.steps = 0
+
+    def step(self):
+        end = time.perf_counter() + self.seconds
+        while time.perf_counter() < end: #busy, holds the interpreter like numpy-free python rounds do
+            pass
+        self.steps += 1
+        return True
+
+    def calculate_satisfaction(self):
+        return 0.0
+
+
+def test_lock_is_released_between_rounds():
+    lock = threading.Lock()
+    model = SlowModel(0.02)
+    worker = SimulationWorker(model, lock, steps_per_frame=50)
+    worker.start()
+    try:
+        for _ in range(5):
+            time.sleep(0.03)
+            start = time.perf_counter()
+            with lock: #a GUI handler waits for about a round, not for the whole batch of 50
+                waited = time.perf_counter() - start
+            assert waited < 0.3
+    finally:
+        start = time.perf_counter()
+        worker.stop()
+    assert time.perf_counter() - start < 0.5
+    assert model.steps < 50
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from models import SchellingModel, SchellingEnsemble
+
+
+def lone_mover_model(empty_ratio):
+    #one dissatisfied agent of type 2 in the middle of type 1 agents, the vacancies (if any) in the corners
+    model = SchellingModel(grid_size=5, threshold=0.3, empty_ratio=empty_ratio, update_mode='synchronous', seed=0)
+    grid = np.ones((5, 5), dtype=model.grid.dtype)
+    grid[2, 2] = 2
+    corners = [(0, 0), (4, 4), (0, 4), (4, 0)]
+    for cell in corners[:int(25 * empty_ratio)]:
+        grid[cell] = model.empty
+    model.grid = grid
+    model.seed_empty_cells(grid)
+    model.update_dissatisfied_agents()
+    return model
+
+
+def test_deal_back_to_own_cell_is_not_convergence():
+    #with one vacancy the lone mover is dealt its own cell half the time, which is still a round
+    model = lone_mover_model(0.04)
+    stayed = 0
+    for _ in range(20):
+        before = model.grid.copy()
+        assert model.step() and model.termination_reason is None
+        stayed += np.array_equal(before, model.grid)
+    assert stayed > 0
+
+
+def test_lone_mover_without_vacancies_converges():
+    model = lone_mover_model(0.0)
+    assert not model.step() and model.termination_reason == 'converged'
+
+
+def test_ensemble_rejects_synchronous_updates():
+    with pytest.raises(ValueError):
+        SchellingEnsemble(replicates=2, grid_size=10, update_mode='synchronous')
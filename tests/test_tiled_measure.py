@@ -0,0 +1,24 @@
+import pytest
+from models import SchellingModel, SchellingIncomeModel, TiledSchellingModel
+from measures import CompositeSegregationMeasure, TiledSegregationMeasure
+import measures.tiled_measure
+
+
+@pytest.mark.parametrize('model_class', [SchellingModel, SchellingIncomeModel])
+@pytest.mark.parametrize('block_values', [1, 100, 2 ** 17])
+def test_blocked_morans_i_matches_in_memory(tmp_path, monkeypatch, model_class, block_values):
+    #however the strip's neighbour products are split into blocks they are summed in the in-memory order
+    monkeypatch.setattr(measures.tiled_measure, 'MORANS_BLOCK_VALUES', block_values)
+    parameters = dict(grid_size=30, threshold=0.5, num_agent_types=3, seed=4)
+    model = model_class(**parameters)
+    tiled = TiledSchellingModel(tmp_path, tile_rows=7, model_class=model_class, **parameters)
+    for _ in range(3):
+        model.step()
+        tiled.step()
+    reference = CompositeSegregationMeasure(model.grid, model.num_agent_types, model.empty_ratio,
+                                            model_class is SchellingIncomeModel)
+    tiled_morans_i = TiledSegregationMeasure(tiled).calculate_morans_i()
+    if model_class is SchellingModel:
+        assert tiled_morans_i == reference.calculate_morans_i()
+    else: #the income model's standard deviations are summed per strip
+        assert tiled_morans_i == pytest.approx(reference.calculate_morans_i(), rel=1e-12)
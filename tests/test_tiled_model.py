@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from models import SchellingModel, SchellingIncomeModel, TiledSchellingModel
+import models.compiled
+from models.compiled import NUMBA_AVAILABLE, relocate_random
+
+
+BACKENDS = ['python', 'numba'] if NUMBA_AVAILABLE else ['python']
+
+
+@pytest.mark.parametrize('model_class', [SchellingModel, SchellingIncomeModel])
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_tiled_model_matches_in_memory_model(tmp_path, model_class, backend):
+    parameters = dict(grid_size=30, threshold=0.6, num_agent_types=3, seed=4, backend=backend)
+    model = model_class(**parameters)
+    tiled = TiledSchellingModel(tmp_path, tile_rows=7, chunk_size=50, model_class=model_class, **parameters)
+    assert tiled.backend == backend
+    for _ in range(6):
+        assert tiled.step() == model.step()
+        assert np.array_equal(tiled.grid, model.grid)
+        assert list(tiled.get_dissatisfied_agents()) == sorted(model.get_dissatisfied_agents())
+
+
+def test_tiled_model_runs_the_python_loop_on_the_python_backend(tmp_path):
+    tiled = TiledSchellingModel(tmp_path, grid_size=20, backend='python')
+    assert tiled.relocate_random is getattr(relocate_random, 'py_func', relocate_random)
+
+
+def test_tiled_model_warns_without_numba(tmp_path, monkeypatch):
+    monkeypatch.setattr(models.compiled, 'NUMBA_AVAILABLE', False)
+    with pytest.warns(RuntimeWarning, match="numba is not installed"):
+        tiled = TiledSchellingModel(tmp_path, grid_size=20, backend='numba')
+    assert tiled.backend == 'python'
+    with pytest.raises(ValueError):
+        TiledSchellingModel(tmp_path, grid_size=20, backend='fortran')
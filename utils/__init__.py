@@ -1,3 +1,8 @@
 from .constants import COLOURS
+from .cell_set import CellSet, ArrayCellSet
+from .instrumentation import Instrumentation
+from .grid_codes import (GRID_DTYPE, EMPTY, MAX_AGENT_TYPES, MAX_INCOME_AGENT_TYPES, TYPE_OF_CODE, INCOME_OF_CODE,
+                         encode_cells, decode_cells)
 
-__all__ = ['COLOURS']
+__all__ = ['COLOURS', 'CellSet', 'ArrayCellSet', 'Instrumentation', 'GRID_DTYPE', 'EMPTY', 'MAX_AGENT_TYPES',
+           'MAX_INCOME_AGENT_TYPES', 'TYPE_OF_CODE', 'INCOME_OF_CODE', 'encode_cells', 'decode_cells']
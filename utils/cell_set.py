@@ -0,0 +1,92 @@
+import numpy as np
+
+
+class CellSet:
+    #set of (x, y) cells backed by a list plus a position map, so add, discard and random choice are all O(1)
+    def __init__(self, cells=()):
+        self.cells = []
+        self.positions = {}
+        for cell in cells:
+            self.add(cell)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __iter__(self):
+        return iter(self.cells)
+
+    def __contains__(self, cell):
+        return cell in self.positions
+
+    def __getitem__(self, index):
+        return self.cells[index]
+
+    def as_array(self):
+        return np.array(self.cells, dtype=np.int64).reshape(-1, 2)
+
+    def add(self, cell):
+        if cell not in self.positions:
+            self.positions[cell] = len(self.cells)
+            self.cells.append(cell)
+
+    def discard(self, cell):
+        index = self.positions.pop(cell, None)
+        if index is None:
+            return
+        last_cell = self.cells.pop()
+        if index < len(self.cells): #moves the last cell into the gap left by the removed one
+            self.cells[index] = last_cell
+            self.positions[last_cell] = index
+
+    def choice(self, rng):
+        #uniform pick from one rng.random() draw, which is the same whether drawn one at a time or in a batch
+        return self.cells[int(rng.random() * len(self.cells))]
+
+
+class ArrayCellSet:
+    #same ordering and operations as CellSet, but kept in numpy arrays so compiled code can update it in place
+    def __init__(self, shape, cells=None):
+        self.positions = np.full(shape, -1, dtype=np.int64) #index of each cell in array, -1 if not in the set
+        self.array = np.zeros((shape[0] * shape[1], 2), dtype=np.int64)
+        self.size = 0
+        if cells is not None and len(cells):
+            cells = np.asarray(cells, dtype=np.int64)
+            self.size = len(cells)
+            self.array[:self.size] = cells
+            self.positions[cells[:, 0], cells[:, 1]] = np.arange(self.size)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return (tuple(cell) for cell in self.array[:self.size].tolist())
+
+    def __contains__(self, cell):
+        return self.positions[cell] >= 0
+
+    def __getitem__(self, index):
+        x, y = self.array[index]
+        return int(x), int(y)
+
+    def as_array(self):
+        return self.array[:self.size].copy()
+
+    def add(self, cell):
+        if self.positions[cell] < 0:
+            self.array[self.size] = cell
+            self.positions[cell] = self.size
+            self.size += 1
+
+    def discard(self, cell):
+        index = self.positions[cell]
+        if index < 0:
+            return
+        self.positions[cell] = -1
+        self.size -= 1
+        if index < self.size: #moves the last cell into the gap left by the removed one
+            last_cell = tuple(self.array[self.size])
+            self.array[index] = last_cell
+            self.positions[last_cell] = index
+
+    def choice(self, rng):
+        return self[int(rng.random() * self.size)]
@@ -0,0 +1,30 @@
+import numpy as np
+
+
+#every cell is one signed byte: -1 for empty, the agent type for the single attribute model (1 to 127),
+#and agent_type * 10 + income_group for the income model (11 to 125)
+GRID_DTYPE = np.int8
+EMPTY = -1
+MAX_AGENT_TYPES = 127 #agent types a byte holds as they are
+MAX_INCOME_AGENT_TYPES = 12 #agent types whose codes with income group 5 still fit in a byte
+
+#lookup tables from income model cell code to each attribute, one entry per byte value so index -1 (empty) wraps to
+#the last entry which is 0
+TYPE_OF_CODE = np.zeros(256, dtype=GRID_DTYPE)
+INCOME_OF_CODE = np.zeros(256, dtype=GRID_DTYPE)
+TYPE_OF_CODE[10:128] = np.arange(10, 128) // 10
+INCOME_OF_CODE[10:128] = np.arange(10, 128) % 10
+
+
+def encode_cells(agent_types, income_groups):
+    #packs the two attributes into single byte codes without going through strings
+    return (np.asarray(agent_types, dtype=GRID_DTYPE) * 10 + np.asarray(income_groups, dtype=GRID_DTYPE)).astype(GRID_DTYPE)
+
+
+def decode_cells(grid, is_income_model):
+    #occupied mask plus type and income planes, empty cells get 0 in both (and every cell 0 income without incomes)
+    grid = np.asarray(grid)
+    occupied = grid != EMPTY
+    if not is_income_model:
+        return occupied, np.where(occupied, grid, 0).astype(GRID_DTYPE), np.zeros(grid.shape, dtype=GRID_DTYPE)
+    return occupied, np.take(TYPE_OF_CODE, grid, mode='wrap'), np.take(INCOME_OF_CODE, grid, mode='wrap')
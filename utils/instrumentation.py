@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+
+
+class Instrumentation:
+    #opt-in counters and per-round series, models and the GUI only touch it when one is attached
+    def __init__(self):
+        self.lock = threading.Lock() #the worker thread records rounds while the GUI records frames
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.counters = defaultdict(float) #running totals
+            self.series = defaultdict(list) #one value per round (or per frame for the GUI entries)
+        self.phase_start = None
+        self.phases = {}
+
+    def start_round(self):
+        self.phases = {}
+        self.phase_start = time.perf_counter()
+
+    def mark(self, phase):
+        #time since the last mark goes to phase
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self.phase_start
+        self.phase_start = now
+
+    def end_round(self, **values):
+        self.record(**{f'{phase}_seconds': seconds for phase, seconds in self.phases.items()}, **values)
+        self.count('rounds')
+
+    def record(self, **values):
+        with self.lock:
+            for name, value in values.items():
+                self.series[name].append(value)
+                self.counters[name] += value
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def values(self, name):
+        with self.lock:
+            return np.array(self.series.get(name, []))
+
+    def histogram(self, name, bins=10):
+        #counts and bin edges of a recorded series, as np.histogram returns them
+        return np.histogram(self.values(name), bins=bins)
+
+    def summary(self, last=50):
+        #total, mean over the last few values and latest value of every series
+        with self.lock:
+            series = {name: np.array(values[-last:]) for name, values in self.series.items() if values}
+            counters = dict(self.counters)
+        return {name: {'total': counters[name], 'mean': float(values.mean()), 'latest': float(values[-1])}
+                for name, values in series.items()}